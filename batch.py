@@ -0,0 +1,561 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import fitz
+
+from manifest import BatchManifest, CheckpointSink
+from ocr_backends import ocr_backends, set_native_thread_variables
+from pdf_to_json import (
+    PDFToOCR,
+    invoice_parsers,
+    ocr_engine_pool,
+    parse_invoice_page,
+)
+from profiling import StageProfiler, get_profiler, set_profiler
+from sinks import BackgroundSink, DocumentFileSink, JSONLinesSink
+from triage import PageTriage, triage_page
+
+
+def collect_pdf_paths(inputs):
+    pdf_paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            pdf_paths.extend(
+                sorted(
+                    os.path.join(path, name)
+                    for name in os.listdir(path)
+                    if name.lower().endswith(".pdf")
+                )
+            )
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+def get_page_count(pdf_path, page_num=0):
+    with fitz.open(pdf_path) as pdf:
+        page_count = pdf.page_count
+    if page_num == 0:
+        return page_count
+    return min(page_num, page_count)
+
+
+class BatchStats:
+    def __init__(self):
+        self.pages = 0
+        # pages left out because an earlier run completed them
+        self.resumed_pages = 0
+        self.skipped_pages = 0
+        self.failed_pages = 0
+        # documents that could not be opened, so have no page results
+        self.failed_documents = 0
+        # triage cost, and full-page OCR time, for pages that went through it
+        self.triage_time = 0.0
+        self.triaged_skips = 0
+        self.ocr_time = 0.0
+        self.ocr_pages = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def record_page(self, result=None):
+        if result is not None and result["page_index"] is None:
+            self.failed_documents += result["status"] == "failed"
+            return
+        self.pages += 1
+        if result is None:
+            return
+        if result["status"] == "skipped":
+            self.skipped_pages += 1
+        elif result["status"] == "failed":
+            self.failed_pages += 1
+        if result.get("triage_time"):
+            self.triage_time += result["triage_time"]
+            self.triaged_skips += result["status"] == "skipped"
+        if result.get("ocr_time"):
+            self.ocr_time += result["ocr_time"]
+            self.ocr_pages += 1
+
+    def get_ocr_time_saved(self):
+        # skipped pages would each have cost a mean full-page OCR run
+        if self.ocr_pages == 0:
+            return 0.0
+        mean_ocr_time = self.ocr_time / self.ocr_pages
+        return self.triaged_skips * mean_ocr_time - self.triage_time
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+
+    def get_elapsed(self):
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def get_pages_per_second(self):
+        elapsed = self.get_elapsed()
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+
+# PDFToOCR jobs held by a worker process, so pages of the same document do not
+# re-hash the PDF; only the few most recent documents are kept
+worker_documents = {}
+max_worker_documents = 4
+worker_triage = None
+worker_manifest = None
+
+
+def init_worker(
+    ocr_config, profile=False, triage=False, manifest_path=None, warm_up=False
+):
+    global worker_triage, worker_manifest
+    if profile:
+        set_profiler(StageProfiler())
+    if triage:
+        worker_triage = PageTriage(ocr_config=ocr_config)
+    if manifest_path is not None:
+        worker_manifest = BatchManifest(manifest_path)
+    # otherwise the engine loads on the first page that needs OCR, so runs
+    # served from the cache or the text layer never load it
+    if warm_up:
+        ocr_engine_pool.warm_up(**ocr_config)
+
+
+def get_worker_document(pdf_path, document_options):
+    if pdf_path not in worker_documents:
+        if len(worker_documents) >= max_worker_documents:
+            del worker_documents[next(iter(worker_documents))]
+        worker_documents[pdf_path] = PDFToOCR(pdf_path, page_num=0, **document_options)
+    return worker_documents[pdf_path]
+
+
+def load_page(pdf_to_ocr, page_index, result):
+    # the page's OCR result, or None when triage skips it
+    if worker_triage is None:
+        start = time.perf_counter()
+        page = pdf_to_ocr.ocr_results[page_index]
+        result["ocr_time"] = time.perf_counter() - start
+        # the page has been handed off, so don't keep it memoized in the worker
+        del pdf_to_ocr.ocr_results.pages[page_index]
+        return page
+    page, verdict = triage_page(pdf_to_ocr, page_index, worker_triage)
+    result["reason"] = verdict["reason"]
+    result["triage_time"] = verdict["triage_time"]
+    result["ocr_time"] = verdict["ocr_time"]
+    return page
+
+
+def record_stage(result, document_hash, stage):
+    if worker_manifest is not None:
+        timings = {
+            key: result[key]
+            for key in ("triage_time", "ocr_time", "parse_time", "elapsed")
+            if key in result
+        }
+        worker_manifest.append(
+            document_hash,
+            result["page_index"],
+            stage,
+            pdf_path=result["pdf_path"],
+            **timings,
+        )
+
+
+def process_page(
+    pdf_path,
+    page_index,
+    document_options,
+    parser,
+    isolate_failures,
+    document_hash=None,
+    row_tolerance=None,
+):
+    start = time.perf_counter()
+    profiler = get_profiler()
+    result = {
+        "pdf_path": pdf_path,
+        "page_index": page_index,
+        "status": "parsed",
+        "invoice": None,
+    }
+    try:
+        pdf_to_ocr = get_worker_document(pdf_path, document_options)
+        page = load_page(pdf_to_ocr, page_index, result)
+        if page is None:
+            result["status"] = "skipped"
+        else:
+            record_stage(result, document_hash, "ocr")
+            parse_start = time.perf_counter()
+            with profiler.stage("parse", page_index):
+                result["invoice"] = parse_invoice_page(
+                    page,
+                    parser=parser,
+                    page_height=pdf_to_ocr.get_page_height(page_index),
+                    row_tolerance=row_tolerance,
+                )
+            result["parse_time"] = time.perf_counter() - parse_start
+    except Exception as error:
+        # one bad page (no anchors, unreadable scan) doesn't abort the batch
+        if not isolate_failures:
+            raise
+        result["status"] = "failed"
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["elapsed"] = time.perf_counter() - start
+    record_stage(result, document_hash, result["status"])
+    if profiler.enabled:
+        # stage timings travel back with the page to the parent's report
+        result["stages"] = [
+            dict(record, pdf_path=pdf_path) for record in profiler.take_records()
+        ]
+    return result
+
+
+def make_document_failure(pdf_path, error, profile=False):
+    # a done future holding the result for a document that could not be
+    # opened, queued with the page results so it keeps its place in the order
+    result = {
+        "pdf_path": pdf_path,
+        "page_index": None,
+        "status": "failed",
+        "invoice": None,
+        "error": f"{type(error).__name__}: {error}",
+        "elapsed": 0.0,
+    }
+    if profile:
+        result["stages"] = []
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def take_completed(pending, ordered):
+    if ordered:
+        yield pending.popleft().result()
+    else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield future.result()
+
+
+def run_batch(
+    inputs,
+    workers=None,
+    ordered=True,
+    page_num=0,
+    ocr_config=None,
+    use_cache=True,
+    parser="pandas",
+    stats=None,
+    use_text_layer=False,
+    dpi=None,
+    profile=False,
+    triage=False,
+    isolate_failures=False,
+    manifest=None,
+    resume_documents=False,
+    warm_up=False,
+    row_tolerance=None,
+):
+    # yields one result per page as soon as it is ready; with ordered=True
+    # results come back in document order then page order, otherwise in
+    # completion order. With a manifest, progress is recorded as pages go and
+    # pages completed by earlier runs are left out (whole documents only, with
+    # resume_documents, for outputs that are written a document at a time).
+    # A document's last result has last_page set.
+    # warm_up loads the OCR engine as each worker starts, except for text
+    # layer runs, which rarely need it
+    ocr_config = ocr_config or {"use_angle_cls": True, "lang": "en"}
+    workers = workers or os.cpu_count()
+    stats = stats or BatchStats()
+    # PDFToOCR options shared by every document, passed to the workers
+    document_options = {
+        "ocr_config": ocr_config,
+        "use_cache": use_cache,
+        "use_text_layer": use_text_layer,
+        "dpi": dpi,
+    }
+    # a bounded number of pages in flight keeps memory flat on huge batches
+    max_pending = workers * 2
+    completed_pages = manifest.get_completed_pages() if manifest else set()
+    # pages still to come back per document
+    pages_left = {}
+
+    def take_results(pending):
+        for result in take_completed(pending, ordered):
+            stats.record_page(result)
+            pages_left[result["pdf_path"]] -= 1
+            result["last_page"] = pages_left[result["pdf_path"]] == 0
+            yield result
+
+    mp_context = None
+    if ocr_config.get("cpu_threads") is not None:
+        # forked workers inherit this process's numpy with its thread pools
+        # already sized, so workers are spawned with the thread variables set
+        # before they import anything
+        set_native_thread_variables(ocr_config["cpu_threads"])
+        mp_context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp_context,
+        initializer=init_worker,
+        initargs=(
+            ocr_config,
+            profile,
+            triage,
+            manifest and manifest.path,
+            warm_up and not use_text_layer,
+        ),
+    ) as executor:
+        pending = deque()
+        for pdf_path in collect_pdf_paths(inputs):
+            try:
+                page_indexes = range(get_page_count(pdf_path, page_num))
+                document_hash = None
+                if manifest is not None:
+                    document_hash = manifest.get_document_hash(pdf_path)
+            except Exception as error:
+                # a corrupt or unreadable PDF fails on its own, like a page
+                if not isolate_failures:
+                    raise
+                pages_left[pdf_path] = pages_left.get(pdf_path, 0) + 1
+                pending.append(make_document_failure(pdf_path, error, profile))
+                continue
+            if manifest is not None:
+                remaining = [
+                    page_index
+                    for page_index in page_indexes
+                    if (document_hash, page_index) not in completed_pages
+                ]
+                if resume_documents and remaining:
+                    remaining = page_indexes
+                stats.resumed_pages += len(page_indexes) - len(remaining)
+                page_indexes = remaining
+            pages_left[pdf_path] = pages_left.get(pdf_path, 0) + len(page_indexes)
+            for page_index in page_indexes:
+                pending.append(
+                    executor.submit(
+                        process_page,
+                        pdf_path,
+                        page_index,
+                        document_options,
+                        parser,
+                        isolate_failures,
+                        document_hash,
+                        row_tolerance,
+                    )
+                )
+                while len(pending) >= max_pending:
+                    yield from take_results(pending)
+        while pending:
+            yield from take_results(pending)
+    stats.finish()
+
+
+def get_ocr_config(args):
+    # only options that are set, so default runs keep their OCR cache keys
+    ocr_config = {"use_angle_cls": True, "lang": "en"}
+    if args.backend != "paddle":
+        ocr_config["backend"] = args.backend
+    for key, value in (
+        ("model_dir", args.model_dir),
+        ("cpu_threads", args.cpu_threads),
+        ("enable_mkldnn", args.mkldnn),
+        ("rec_batch_num", args.rec_batch_size),
+    ):
+        if value is not None:
+            ocr_config[key] = value
+    return ocr_config
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="OCR and parse directories or lists of invoice PDFs"
+    )
+    arg_parser.add_argument("inputs", nargs="+", help="PDF files or directories")
+    arg_parser.add_argument("--workers", type=int, default=None)
+    arg_parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="emit pages as they complete instead of in document order",
+    )
+    arg_parser.add_argument(
+        "--page-num", type=int, default=0, help="pages per PDF to process, 0 for all"
+    )
+    arg_parser.add_argument("--no-cache", action="store_true")
+    arg_parser.add_argument(
+        "--text-layer",
+        action="store_true",
+        help="read born-digital pages from the PDF text layer instead of OCR",
+    )
+    arg_parser.add_argument(
+        "--dpi",
+        type=int,
+        default=None,
+        help="rendering DPI, PaddleOCR's default zoom when omitted",
+    )
+    arg_parser.add_argument(
+        "--parser",
+        choices=sorted(invoice_parsers),
+        default="pandas",
+        help="invoice parsing engine",
+    )
+    arg_parser.add_argument(
+        "--row-tolerance",
+        type=float,
+        default=None,
+        help="max y distance, in pixels at 144 DPI, for aligning a table cell "
+        "to a row; unmatched cells are reported instead of snapped",
+    )
+    arg_parser.add_argument(
+        "--backend", choices=sorted(ocr_backends), default="paddle", help="OCR backend"
+    )
+    arg_parser.add_argument(
+        "--model-dir", default=None, help="locally exported OCR models"
+    )
+    arg_parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=None,
+        help="intra-op threads per worker; workers x threads should fit the cores",
+    )
+    arg_parser.add_argument(
+        "--mkldnn",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="use oneDNN (MKL-DNN) kernels",
+    )
+    arg_parser.add_argument(
+        "--rec-batch-size",
+        type=int,
+        default=None,
+        help="text crops per recognizer call",
+    )
+    arg_parser.add_argument(
+        "--warm-up",
+        action="store_true",
+        help="load the OCR engine as each worker starts instead of on first use",
+    )
+    arg_parser.add_argument(
+        "--triage",
+        action="store_true",
+        help="OCR only the header strip first and skip pages that are not invoices",
+    )
+    arg_parser.add_argument(
+        "--isolate-failures",
+        action="store_true",
+        help="report pages that fail to OCR or parse instead of aborting",
+    )
+    arg_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="append progress to this manifest and skip pages it lists as done",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        default=None,
+        help="write a per-stage timing report to this .json or .csv file",
+    )
+    arg_parser.add_argument("--output", default=None, help="JSON Lines output file")
+    arg_parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="write one JSON file per PDF to this directory instead",
+    )
+    args = arg_parser.parse_args(argv)
+
+    ocr_config = get_ocr_config(args)
+    manifest = None
+    resuming = False
+    if args.manifest is not None:
+        manifest = BatchManifest(args.manifest)
+        resuming = os.path.exists(args.manifest)
+    if args.output_dir is not None:
+        output_sink = DocumentFileSink(args.output_dir)
+    else:
+        # a resumed run adds its pages to the earlier runs' output
+        output_sink = JSONLinesSink(args.output or sys.stdout.buffer, append=resuming)
+    if manifest is not None:
+        output_sink = CheckpointSink(output_sink, manifest)
+        if resuming and args.output_dir is None:
+            output_sink.recover_written_pages(output_sink.sink.written_pages)
+    # encoding and writing happen off the loop collecting worker results
+    sink = BackgroundSink(output_sink)
+    stats = BatchStats()
+    profiler = StageProfiler() if args.profile is not None else None
+    try:
+        for result in run_batch(
+            args.inputs,
+            workers=args.workers,
+            ordered=not args.unordered,
+            page_num=args.page_num,
+            ocr_config=ocr_config,
+            use_cache=not args.no_cache,
+            parser=args.parser,
+            stats=stats,
+            use_text_layer=args.text_layer,
+            dpi=args.dpi,
+            profile=args.profile is not None,
+            triage=args.triage,
+            isolate_failures=args.isolate_failures,
+            manifest=manifest,
+            resume_documents=args.output_dir is not None,
+            warm_up=args.warm_up,
+            row_tolerance=args.row_tolerance,
+        ):
+            if profiler is not None:
+                profiler.add_records(result.pop("stages"))
+            if result["status"] == "parsed":
+                sink.write(result["invoice"], result["pdf_path"], result["page_index"])
+            elif result["status"] == "failed" and result["page_index"] is None:
+                print(
+                    f"{result['pdf_path']} failed: {result['error']}", file=sys.stderr
+                )
+            elif result["status"] == "failed":
+                print(
+                    f"{result['pdf_path']} page {result['page_index']} failed: "
+                    f"{result['error']}",
+                    file=sys.stderr,
+                )
+            if result["last_page"]:
+                sink.end_document(result["pdf_path"])
+    finally:
+        sink.close()
+        if manifest is not None:
+            manifest.close()
+
+    if profiler is not None:
+        profiler.save_report(args.profile)
+
+    print(
+        f"processed {stats.pages} pages in {stats.get_elapsed():.2f}s "
+        f"({stats.get_pages_per_second():.2f} pages/s)",
+        file=sys.stderr,
+    )
+    if stats.resumed_pages:
+        print(
+            f"resumed: {stats.resumed_pages} pages already done by earlier runs",
+            file=sys.stderr,
+        )
+    if args.triage or args.isolate_failures:
+        print(
+            f"skipped {stats.skipped_pages} non-invoice pages, "
+            f"{stats.failed_pages} pages failed",
+            file=sys.stderr,
+        )
+    if stats.failed_documents:
+        print(
+            f"{stats.failed_documents} documents could not be opened",
+            file=sys.stderr,
+        )
+    if args.triage:
+        print(
+            f"triage took {stats.triage_time:.2f}s, "
+            f"saving an estimated {stats.get_ocr_time_saved():.2f}s of OCR",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
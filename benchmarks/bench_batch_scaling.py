@@ -0,0 +1,25 @@
+import os
+import sys
+
+from batch import BatchStats, run_batch
+
+
+def main(*inputs):
+    inputs = inputs or ("Sample_For_Assignment.pdf",)
+    worker_counts = sorted({1, 2, 4, os.cpu_count()})
+    baseline = None
+    for workers in worker_counts:
+        stats = BatchStats()
+        for _ in run_batch(inputs, workers=workers, use_cache=False, stats=stats):
+            pass
+        pages_per_second = stats.get_pages_per_second()
+        baseline = baseline or pages_per_second
+        print(
+            f"workers={workers}: {stats.pages} pages, "
+            f"{pages_per_second:.2f} pages/s, "
+            f"scaling {pages_per_second / baseline:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,87 @@
+import argparse
+import os
+import time
+
+from batch import run_batch
+from ocr_backends import ocr_backends
+
+
+def get_thread_counts(max_threads):
+    counts = []
+    count = 1
+    while count <= max_threads:
+        counts.append(count)
+        count *= 2
+    if counts[-1] != max_threads:
+        counts.append(max_threads)
+    return counts
+
+
+def measure(pdf_paths, processes, ocr_config):
+    # steady-state pages/s: from the first finished page to the last, so model
+    # loading in the workers is left out
+    finish_times = []
+    for _ in run_batch(
+        pdf_paths,
+        workers=processes,
+        ordered=False,
+        ocr_config=ocr_config,
+        use_cache=False,
+    ):
+        finish_times.append(time.perf_counter())
+    if len(finish_times) < 2:
+        return 0.0
+    return (len(finish_times) - 1) / (finish_times[-1] - finish_times[0])
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="find the fastest worker processes x intra-op threads for OCR"
+    )
+    arg_parser.add_argument("pdf_path")
+    arg_parser.add_argument("--copies", type=int, default=4, help="copies of the PDF")
+    arg_parser.add_argument("--backend", choices=sorted(ocr_backends), default="paddle")
+    arg_parser.add_argument("--model-dir", default=None)
+    arg_parser.add_argument(
+        "--mkldnn", action=argparse.BooleanOptionalAction, default=None
+    )
+    arg_parser.add_argument("--rec-batch-size", type=int, default=None)
+    arg_parser.add_argument("--cores", type=int, default=os.cpu_count())
+    arg_parser.add_argument(
+        "--oversubscribe",
+        action="store_true",
+        help="also try configurations using more threads than cores",
+    )
+    args = arg_parser.parse_args(argv)
+
+    ocr_config = {"use_angle_cls": True, "lang": "en", "backend": args.backend}
+    for key, value in (
+        ("model_dir", args.model_dir),
+        ("enable_mkldnn", args.mkldnn),
+        ("rec_batch_num", args.rec_batch_size),
+    ):
+        if value is not None:
+            ocr_config[key] = value
+    pdf_paths = [args.pdf_path] * args.copies
+
+    results = []
+    print(f"{'processes':>9} {'threads':>7} {'pages/s':>8}")
+    for processes in get_thread_counts(args.cores):
+        for threads in get_thread_counts(args.cores):
+            if processes * threads > args.cores and not args.oversubscribe:
+                continue
+            pages_per_second = measure(
+                pdf_paths, processes, dict(ocr_config, cpu_threads=threads)
+            )
+            results.append((pages_per_second, processes, threads))
+            print(f"{processes:>9} {threads:>7} {pages_per_second:>8.2f}")
+
+    pages_per_second, processes, threads = max(results)
+    print(
+        f"best: --workers {processes} --cpu-threads {threads} "
+        f"({pages_per_second:.2f} pages/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_text_layer import make_digital_pdf
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import PDFToOCR, ocr_engine_pool, render_pdf_page, stream_invoices
+
+
+def flatten_fields(value, prefix=""):
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix: value}
+    fields = {}
+    for key, item in items:
+        fields.update(flatten_fields(item, f"{prefix}/{key}"))
+    return fields
+
+
+def get_field_accuracy(invoices, reference_invoices):
+    reference = flatten_fields(reference_invoices)
+    fields = flatten_fields(invoices)
+    matched = sum(fields.get(key) == value for key, value in reference.items())
+    return matched / len(reference)
+
+
+def parse_pdf(pdf_path, **options):
+    invoices = []
+    for invoice_json in stream_invoices(
+        PDFToOCR(pdf_path, page_num=0, use_cache=False, **options)
+    ):
+        invoices.append(invoice_json)
+    return invoices
+
+
+def main(pdf_path=None, dpis=(72, 100, 144, 200, 300)):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp_dir, "digital_invoice.pdf")
+            make_digital_pdf(pdf_path, make_invoice_document(n_pages=3, n_items=20))
+
+        # a born-digital PDF's text layer is the reference; scans have none
+        # and fall back to OCR at the highest DPI
+        reference = parse_pdf(pdf_path, use_text_layer=True, dpi=max(dpis))
+        ocr_engine_pool.warm_up()
+        print("dpi  render/page  ocr+parse/page  field accuracy")
+        for dpi in dpis:
+            start = time.perf_counter()
+            invoices = parse_pdf(pdf_path, dpi=dpi)
+            per_page = (time.perf_counter() - start) / len(invoices)
+            start = time.perf_counter()
+            for page_index in range(len(invoices)):
+                render_pdf_page(pdf_path, page_index, dpi)
+            render = (time.perf_counter() - start) / len(invoices)
+            accuracy = get_field_accuracy(invoices, reference)
+            print(
+                f"{dpi:>3}  {render * 1000:>9.1f}ms  {per_page * 1000:>12.1f}ms"
+                f"  {accuracy:>14.1%}"
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
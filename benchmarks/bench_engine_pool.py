@@ -0,0 +1,42 @@
+import sys
+import time
+
+from pdf_to_json import OCREnginePool, PDFToOCR
+
+
+def main(pdf_path="Sample_For_Assignment.pdf", n_docs=3, page_num=2):
+    pool = OCREnginePool()
+
+    start = time.perf_counter()
+    pool.warm_up()
+    startup_time = time.perf_counter() - start
+    print(f"engine startup (model load): {startup_time:.3f}s")
+
+    # cold path: every document pays for model loading, as before the pool
+    cold_times = []
+    for _ in range(n_docs):
+        pool.clear()
+        start = time.perf_counter()
+        PDFToOCR(
+            pdf_path, page_num=page_num, ocr_engine=pool.get_engine(), use_cache=False
+        ).perform_ocr()
+        cold_times.append(time.perf_counter() - start)
+
+    # warm path: the engine is loaded once and shared by every document
+    warm_times = []
+    for _ in range(n_docs):
+        start = time.perf_counter()
+        PDFToOCR(
+            pdf_path, page_num=page_num, ocr_engine=pool.get_engine(), use_cache=False
+        ).perform_ocr()
+        warm_times.append(time.perf_counter() - start)
+
+    cold = sum(cold_times) / n_docs
+    warm = sum(warm_times) / n_docs
+    print(f"cold per-document latency: {cold:.3f}s")
+    print(f"warm per-document latency: {warm:.3f}s")
+    print(f"speedup: {cold / warm:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
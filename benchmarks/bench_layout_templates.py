@@ -0,0 +1,44 @@
+import copy
+import sys
+import timeit
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from layouts import ExtractionPlan, layout_registry, sgh_layout
+from pdf_to_json import parse_invoice_page
+
+
+def make_other_layout(index):
+    # a layout for another hospital, with anchors of its own
+    layout = copy.deepcopy(sgh_layout)
+    layout["name"] = f"hospital_{index}"
+    layout["hospital_names"] = [f"Hospital Number {index}"]
+    layout["anchors"].update(
+        {f"Field {index}.{field}": f"FIELD {index}\\.{field}" for field in range(20)}
+    )
+    return layout
+
+
+def time_parse(page, repeat):
+    return min(timeit.repeat(lambda: parse_invoice_page(page), number=1, repeat=repeat))
+
+
+def main(n_layouts=100, repeat=50):
+    n_layouts, repeat = int(n_layouts), int(repeat)
+    page = make_invoice_page(n_items=50, n_noise=200)
+
+    compile_time = min(
+        timeit.repeat(lambda: ExtractionPlan(sgh_layout), number=1, repeat=repeat)
+    )
+    print(f"compile one layout: {compile_time * 1000:.3f} ms")
+
+    before = time_parse(page, repeat)
+    for index in range(n_layouts):
+        layout_registry.register(make_other_layout(index))
+    after = time_parse(page, repeat)
+    # templates for other hospitals are never scanned, so both should match
+    print(f"parse with 1 layout: {before * 1000:.2f} ms")
+    print(f"parse with {n_layouts + 1} layouts: {after * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,42 @@
+import sys
+import timeit
+
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import PDFToOCR, parse_invoice_page
+
+
+def main(ocr_json_path=None, repeat=20):
+    # recorded OCR JSON (as written by save_ocr_results_as_json) when given,
+    # synthetic invoice pages otherwise
+    if ocr_json_path:
+        pages = PDFToOCR(from_json=True, ocr_json_path=ocr_json_path).ocr_results
+    else:
+        pages = make_invoice_document(n_pages=2, n_items=10) + make_invoice_document(
+            n_pages=2, n_items=40, n_noise=100
+        )
+
+    for i, page in enumerate(pages):
+        pandas_json = parse_invoice_page(page, parser="pandas")
+        lean_json = parse_invoice_page(page, parser="lean")
+        assert pandas_json == lean_json, f"page {i}: parsers disagree"
+
+        timings = {
+            parser: min(
+                timeit.repeat(
+                    lambda: parse_invoice_page(page, parser=parser),
+                    number=1,
+                    repeat=int(repeat),
+                )
+            )
+            for parser in ("pandas", "lean")
+        }
+        print(
+            f"page {i} ({len(page)} boxes): identical JSON, "
+            f"pandas {timings['pandas'] * 1000:.2f} ms, "
+            f"lean {timings['lean'] * 1000:.2f} ms, "
+            f"speedup {timings['pandas'] / timings['lean']:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,42 @@
+import sys
+import timeit
+
+import pandas as pd
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from pdf_to_json import SingGenHospInvoice
+
+
+def make_invoice_df_per_row(page):
+    # the previous implementation: one Python-level apply per column
+    df = pd.DataFrame(page, columns=["bbox", "text"])
+    df["text"] = df["text"].apply(lambda x: x[0].strip())
+    df["bbox_upper_left_x"] = df["bbox"].apply(lambda x: x[0][0])
+    df["bbox_upper_left_y"] = df["bbox"].apply(lambda x: x[0][1])
+    df["bbox_upper_right_x"] = df["bbox"].apply(lambda x: x[1][0])
+    df["bbox_upper_right_y"] = df["bbox"].apply(lambda x: x[1][1])
+    df["bbox_lower_right_x"] = df["bbox"].apply(lambda x: x[2][0])
+    df["bbox_lower_right_y"] = df["bbox"].apply(lambda x: x[2][1])
+    df["bbox_lower_left_x"] = df["bbox"].apply(lambda x: x[3][0])
+    df["bbox_lower_left_y"] = df["bbox"].apply(lambda x: x[3][1])
+    return df
+
+
+def main(n_noise=5000, repeat=20):
+    page = make_invoice_page(n_items=50, n_noise=int(n_noise))
+    invoice = SingGenHospInvoice()
+
+    per_row = min(
+        timeit.repeat(lambda: make_invoice_df_per_row(page), number=1, repeat=repeat)
+    )
+    vectorized = min(
+        timeit.repeat(lambda: invoice.make_invoice_df(page), number=1, repeat=repeat)
+    )
+    print(f"boxes: {len(page)}")
+    print(f"per-row apply: {per_row * 1000:.2f} ms")
+    print(f"vectorized:    {vectorized * 1000:.2f} ms")
+    print(f"speedup: {per_row / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
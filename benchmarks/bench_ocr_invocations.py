@@ -0,0 +1,61 @@
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from ocr_cache import OCRResultCache
+from pdf_to_json import PDFToOCR, parse_invoice_page
+
+
+class CountingOCREngine:
+    # stands in for PaddleOCR so the check runs without the models; every
+    # call returns a synthetic invoice page in PaddleOCR's result shape
+    def __init__(self):
+        self.calls = 0
+
+    def ocr(self, page_image, cls=True):
+        self.calls += 1
+        return [make_invoice_page(page_number=self.calls)]
+
+
+def parse_pages(pages):
+    for page in pages:
+        parse_invoice_page(page)
+
+
+def main(pdf_path="Sample_For_Assignment.pdf", page_num=2):
+    ocr_engine = CountingOCREngine()
+    start = time.perf_counter()
+    pdf_to_ocr = PDFToOCR(
+        pdf_path, page_num=page_num, ocr_engine=ocr_engine, use_cache=False
+    )
+    assert ocr_engine.calls == 0, "OCR ran before any page was accessed"
+
+    # the access pattern of the old __main__ block plus repeated re-parsing
+    pdf_to_ocr.perform_ocr()
+    parse_pages(pdf_to_ocr.ocr_results[:2])
+    parse_pages(pdf_to_ocr.ocr_results)
+    pdf_to_ocr.ocr_results[0]
+    elapsed = time.perf_counter() - start
+
+    n_pages = len(pdf_to_ocr.ocr_results)
+    print(f"pages: {n_pages}, engine invocations: {ocr_engine.calls}")
+    print(f"elapsed: {elapsed:.3f}s")
+    assert ocr_engine.calls == n_pages, "a page was OCR'd more than once"
+
+    # a second job over the same PDF must be served entirely from the cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ocr_cache = OCRResultCache(cache_dir)
+        for _ in range(2):
+            ocr_engine = CountingOCREngine()
+            pdf_to_ocr = PDFToOCR(
+                pdf_path, page_num=0, ocr_engine=ocr_engine, ocr_cache=ocr_cache
+            )
+            parse_pages(pdf_to_ocr.ocr_results)
+        print(f"cached re-parse engine invocations: {ocr_engine.calls}")
+        print(f"cache stats: {ocr_cache.get_stats()}")
+        assert ocr_engine.calls == 0, "a cached page was OCR'd again"
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
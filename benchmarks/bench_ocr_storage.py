@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from ocr_store import ColumnarOCRStore, get_page_columns, write_columnar_store
+
+
+def make_corpus(n_pages):
+    # a few distinct synthetic pages of different sizes, repeated
+    templates = [
+        make_invoice_page(n_items=n_items, page_number=index + 1)
+        for index, n_items in enumerate([5, 10, 20, 40])
+    ]
+    return [templates[index % len(templates)] for index in range(n_pages)]
+
+
+def load_columns(pages):
+    # what the parser needs from every page: float32 boxes and texts
+    for page in pages:
+        get_page_columns(page)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def save_json(pages, json_path):
+    with open(json_path, "w") as f:
+        json.dump({"results": pages}, f)
+
+
+def load_json(json_path):
+    with open(json_path, "r") as f:
+        return json.load(f)["results"]
+
+
+def main(n_pages=10000):
+    n_pages = int(n_pages)
+    pages = make_corpus(n_pages)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "ocr_results.json")
+        store_path = os.path.join(tmp_dir, "ocr_results.ocrc")
+        _, json_write = timed(
+            lambda: json.dump({"results": pages}, open(json_path, "w"))
+        )
+        _, store_write = timed(lambda: write_columnar_store(pages, store_path))
+
+        json_pages, json_load = timed(lambda: load_json(json_path))
+        _, json_columns = timed(lambda: load_columns(json_pages))
+        store, store_load = timed(lambda: ColumnarOCRStore(store_path))
+        _, store_columns = timed(lambda: load_columns(store))
+
+        n_boxes = sum(len(page) for page in pages)
+        print(f"pages: {n_pages}, boxes: {n_boxes}")
+        print(
+            f"size: JSON {os.path.getsize(json_path) / 2**20:.1f} MiB, "
+            f"columnar {os.path.getsize(store_path) / 2**20:.1f} MiB"
+        )
+        print(f"write: JSON {json_write:.2f}s, columnar {store_write:.2f}s")
+        print(f"open: JSON {json_load:.3f}s, columnar {store_load:.3f}s")
+        print(
+            f"open + parser arrays for every page: JSON "
+            f"{json_load + json_columns:.2f}s, columnar "
+            f"{store_load + store_columns:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+import sinks
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import parse_invoice_page
+
+
+def main(n_pages=200, repeat=5):
+    pages = make_invoice_document(n_pages=20, n_items=20)
+    invoices = [parse_invoice_page(page, parser="lean") for page in pages]
+    invoices = (invoices * (n_pages // len(invoices) + 1))[:n_pages]
+    tmp_dir = tempfile.mkdtemp()
+
+    # the debug files every page used to write to the working directory
+    debug_dir = os.path.join(tmp_dir, "debug")
+    for label, kwargs in [
+        ("no debug files", {}),
+        ("debug files", {"debug_dir": debug_dir}),
+    ]:
+        parse_time = min(
+            timeit.repeat(
+                lambda: [
+                    parse_invoice_page(
+                        page, parser="lean", page_index=page_index, **kwargs
+                    )
+                    for page_index, page in enumerate(pages)
+                ],
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(f"parse, {label}: {parse_time / len(pages) * 1000:.3f}ms/page")
+
+    jsonl_path = os.path.join(tmp_dir, "invoices.jsonl")
+
+    def write_jsonl(sink_class):
+        with sink_class(jsonl_path) as sink:
+            for page_index, invoice_json in enumerate(invoices):
+                sink.write(invoice_json, "invoice.pdf", page_index)
+
+    def write_background():
+        with sinks.BackgroundSink(sinks.JSONLinesSink(jsonl_path)) as sink:
+            for page_index, invoice_json in enumerate(invoices):
+                sink.write(invoice_json, "invoice.pdf", page_index)
+
+    serializer = "orjson" if sinks.orjson is not None else "json"
+    for label, write in [
+        (f"JSONLinesSink ({serializer})", lambda: write_jsonl(sinks.JSONLinesSink)),
+        ("BackgroundSink, including the final drain", write_background),
+    ]:
+        write_time = min(timeit.repeat(write, number=1, repeat=repeat))
+        print(f"{label}: {write_time / n_pages * 1e6:.1f}us/page")
+
+    encode_time = min(
+        timeit.repeat(
+            lambda: [json.dumps(i) for i in invoices], number=1, repeat=repeat
+        )
+    )
+    print(f"json.dumps only: {encode_time / n_pages * 1e6:.1f}us/page")
+    if sinks.orjson is not None:
+        encode_time = min(
+            timeit.repeat(
+                lambda: [sinks.orjson.dumps(i) for i in invoices],
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(f"orjson.dumps only: {encode_time / n_pages * 1e6:.1f}us/page")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
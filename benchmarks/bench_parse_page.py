@@ -0,0 +1,23 @@
+import sys
+import timeit
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from pdf_to_json import parse_invoice_page
+
+
+def main(repeat=20):
+    for n_items, n_noise in [(10, 0), (50, 200), (200, 2000)]:
+        page = make_invoice_page(n_items=n_items, n_noise=n_noise)
+        elapsed = min(
+            timeit.repeat(
+                lambda: parse_invoice_page(page), number=1, repeat=int(repeat)
+            )
+        )
+        print(
+            f"items={n_items} boxes={len(page)}: "
+            f"full-page parse {elapsed * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from pdf_to_json import PDFToOCR, ocr_engine_pool
+
+
+def run(pdf_path, page_num, roi_mode):
+    ocr_config = {"use_angle_cls": True, "lang": "en", "roi_mode": roi_mode}
+    pdf_to_ocr = PDFToOCR(
+        pdf_path, page_num=page_num, ocr_config=ocr_config, use_cache=False
+    )
+    page_times = []
+    start = time.perf_counter()
+    for _ in pdf_to_ocr.iter_pages():
+        page_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+    return pdf_to_ocr.ocr_results.ocr_engine, page_times
+
+
+def main(pdf_path="Sample_For_Assignment.pdf", page_num=0):
+    ocr_engine_pool.warm_up()
+
+    _, full_times = run(pdf_path, page_num, roi_mode=False)
+    roi_engine, roi_times = run(pdf_path, page_num, roi_mode=True)
+
+    # without ROI mode every detected box goes through the recognizer
+    n_pages = len(full_times)
+    full = sum(full_times) / n_pages
+    roi = sum(roi_times) / n_pages
+    print(f"pages: {n_pages}")
+    print(f"recognizer invocations, full pages: {roi_engine.detected_boxes}")
+    print(f"recognizer invocations, ROI mode: {roi_engine.recognized_boxes}")
+    print(f"per-page latency, full pages: {full:.3f}s")
+    print(f"per-page latency, ROI mode: {roi:.3f}s")
+    print(f"speedup: {full / roi:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,77 @@
+import sys
+import timeit
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from pdf_to_json import SingGenHospInvoice
+
+
+def align_invoice_table_columns_per_row(invoice):
+    # the previous implementation: a full argsort of every other column per row
+    (
+        df_invoice_table_codes,
+        df_invoice_table_description,
+        df_invoice_table_quantity,
+        df_invoice_table_amount,
+    ) = invoice.get_invoice_table_by_column(invoice.get_invoice_table_df())
+
+    line_items = []
+    for i, row in df_invoice_table_codes.iterrows():
+        line_items.append(
+            {
+                "item_code": row["text"],
+                "item_description": df_invoice_table_description.iloc[
+                    (
+                        df_invoice_table_description["bbox_upper_left_y"]
+                        - row["bbox_upper_left_y"]
+                    )
+                    .abs()
+                    .argsort()[:1]
+                ]["text"].values[0],
+                "item_quantity": df_invoice_table_quantity.iloc[
+                    (
+                        df_invoice_table_quantity["bbox_upper_left_y"]
+                        - row["bbox_upper_left_y"]
+                    )
+                    .abs()
+                    .argsort()[:1]
+                ]["text"].values[0],
+                "item_amount": df_invoice_table_amount.iloc[
+                    (
+                        df_invoice_table_amount["bbox_upper_left_y"]
+                        - row["bbox_upper_left_y"]
+                    )
+                    .abs()
+                    .argsort()[:1]
+                ]["text"].values[0],
+            }
+        )
+    return line_items
+
+
+def main(repeat=5):
+    for n_items in [100, 300, 1000]:
+        invoice = SingGenHospInvoice()
+        invoice.make_invoice_df(make_invoice_page(n_items=n_items))
+
+        per_row = min(
+            timeit.repeat(
+                lambda: align_invoice_table_columns_per_row(invoice),
+                number=1,
+                repeat=int(repeat),
+            )
+        )
+        vectorized = min(
+            timeit.repeat(
+                invoice.align_invoice_table_columns, number=1, repeat=int(repeat)
+            )
+        )
+        assert invoice.invoice_table == align_invoice_table_columns_per_row(invoice)
+        print(
+            f"line items={n_items}: per-row {per_row * 1000:.1f} ms, "
+            f"searchsorted {vectorized * 1000:.1f} ms, "
+            f"speedup {per_row / vectorized:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import fitz
+import numpy as np
+
+from benchmarks.bench_text_layer import make_digital_pdf
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import ocr_engine_pool, render_pdf_page
+from service import InvoiceService
+
+
+async def run_client(service, page_images, n_requests, latencies):
+    for i in range(n_requests):
+        start = time.perf_counter()
+        await service.parse_page_image(page_images[i % len(page_images)])
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_load(page_images, n_clients, n_requests, max_batch_size):
+    latencies = []
+    async with InvoiceService(max_batch_size=max_batch_size) as service:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_client(service, page_images, n_requests, latencies)
+                for _ in range(n_clients)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    return latencies, elapsed, service.stats
+
+
+def main(pdf_path=None, n_clients=8, n_requests=5):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp_dir, "invoice.pdf")
+            make_digital_pdf(pdf_path, make_invoice_document(n_pages=4, n_items=10))
+        with fitz.open(pdf_path) as pdf:
+            page_count = pdf.page_count
+        page_images = [
+            render_pdf_page(pdf_path, page_index) for page_index in range(page_count)
+        ]
+
+    ocr_engine_pool.warm_up()
+    print(f"{n_clients} concurrent clients, {n_requests} pages each")
+    for max_batch_size in (1, 4, 8):
+        latencies, elapsed, stats = asyncio.run(
+            run_load(page_images, n_clients, n_requests, max_batch_size)
+        )
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(
+            f"max batch {max_batch_size}: p50 {p50 * 1000:.0f}ms, "
+            f"p99 {p99 * 1000:.0f}ms, {len(latencies) / elapsed:.2f} pages/s, "
+            f"mean batch {stats.get_mean_batch_size():.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import time
+
+import fitz
+
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import PDFToOCR, parse_invoice_page
+
+
+def make_digital_pdf(pdf_path, pages):
+    # writes each synthetic page's text at its box position (PaddleOCR renders
+    # A4 at 2x zoom), giving a born-digital invoice PDF
+    pdf = fitz.open()
+    for page in pages:
+        pdf_page = pdf.new_page(width=595, height=842)
+        for box, (text, _) in page:
+            (x0, y0), _, (_, y1), _ = box
+            pdf_page.insert_text(
+                (x0 / 2, y1 / 2 - 2), text, fontsize=(y1 - y0) / 2 * 0.8
+            )
+    pdf.save(pdf_path)
+
+
+def time_pages(pdf_path, use_text_layer):
+    pdf_to_ocr = PDFToOCR(
+        pdf_path, page_num=0, use_cache=False, use_text_layer=use_text_layer
+    )
+    start = time.perf_counter()
+    n_pages = 0
+    for page in pdf_to_ocr.iter_pages():
+        parse_invoice_page(page)
+        n_pages += 1
+    return (time.perf_counter() - start) / n_pages, pdf_to_ocr.ocr_results
+
+
+def main(pdf_path=None, n_pages=10):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp_dir, "digital_invoice.pdf")
+            make_digital_pdf(pdf_path, make_invoice_document(n_pages, n_items=20))
+
+        text_layer, results = time_pages(pdf_path, use_text_layer=True)
+        print(
+            f"text layer pages: {results.text_layer_pages}, "
+            f"OCR fallback pages: {results.engine_calls}"
+        )
+        print(f"per-page latency, text layer + parse: {text_layer * 1000:.1f}ms")
+        if "--ocr" in sys.argv:
+            ocr, _ = time_pages(pdf_path, use_text_layer=False)
+            print(f"per-page latency, OCR + parse: {ocr * 1000:.1f}ms")
+            print(f"speedup: {ocr / text_layer:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*[arg for arg in sys.argv[1:2] if arg != "--ocr"])
@@ -0,0 +1,45 @@
+import re
+import sys
+import timeit
+
+import pandas as pd
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from pdf_to_json import NormalizedCells
+
+
+def add_decimal_point(text):
+    if text.find(".") == -1:
+        return text[:-2] + "." + text[-2:]
+    else:
+        return text
+
+
+def normalize_per_cell(texts):
+    # the previous approach: uncompiled re.sub per cell through Series.apply,
+    # string surgery for the decimal point, then float()
+    series = pd.Series(texts)
+    digits = series.apply(lambda x: re.sub(r"[^0-9]", "", x))
+    labels = series.apply(lambda x: re.sub(r"[^A-Za-z0-9\.\s]", "", x))
+    amounts = labels.apply(lambda x: re.sub(r"[^0-9\.]", "", x))
+    amounts = amounts[amounts != ""].apply(add_decimal_point)
+    return digits, labels, [float(x) for x in amounts if x.count(".") == 1]
+
+
+def main(repeat=10):
+    page = make_invoice_page(n_items=500, n_noise=5000)
+    texts = [box[1][0] for box in page]
+
+    per_cell = min(
+        timeit.repeat(lambda: normalize_per_cell(texts), number=1, repeat=int(repeat))
+    )
+    compiled = min(
+        timeit.repeat(lambda: NormalizedCells(texts), number=1, repeat=int(repeat))
+    )
+    print(f"cells: {len(texts)}")
+    print(f"per-cell apply:   {len(texts) / per_cell:,.0f} cells/s")
+    print(f"normalized cells: {len(texts) / compiled:,.0f} cells/s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import time
+
+import fitz
+
+from batch import BatchStats
+from benchmarks.bench_text_layer import make_digital_pdf
+from benchmarks.synthetic_invoice import make_invoice_document
+from pdf_to_json import PDFToOCR, ocr_engine_pool, parse_invoice_page
+from triage import PageTriage, triage_page
+
+
+def make_mixed_bundle(pdf_path, n_invoices, n_other):
+    # invoice pages followed by cover sheets and remarks pages
+    make_digital_pdf(pdf_path, make_invoice_document(n_invoices, n_items=20))
+    pdf = fitz.open(pdf_path)
+    for index in range(n_other):
+        pdf_page = pdf.new_page(width=595, height=842)
+        pdf_page.insert_text((60, 80), f"Cover sheet {index + 1}", fontsize=18)
+        for line in range(20):
+            pdf_page.insert_text(
+                (60, 140 + line * 24), f"Remarks line {line + 1}", fontsize=11
+            )
+    pdf.saveIncr()
+
+
+def run(pdf_path, use_triage):
+    # full OCR and parse of every page, failures counted rather than raised
+    pdf_to_ocr = PDFToOCR(pdf_path, page_num=0, use_cache=False)
+    page_triage = PageTriage() if use_triage else None
+    stats = BatchStats()
+    for page_index in range(len(pdf_to_ocr.ocr_results)):
+        result = {"status": "parsed"}
+        try:
+            if page_triage is None:
+                start = time.perf_counter()
+                page = pdf_to_ocr.ocr_results[page_index]
+                result["ocr_time"] = time.perf_counter() - start
+            else:
+                page, verdict = triage_page(pdf_to_ocr, page_index, page_triage)
+                result.update(verdict)
+            if page is None:
+                result["status"] = "skipped"
+            else:
+                parse_invoice_page(
+                    page, page_height=pdf_to_ocr.get_page_height(page_index)
+                )
+        except Exception:
+            result["status"] = "failed"
+        stats.record_page(result)
+    stats.finish()
+    return stats
+
+
+def main(pdf_path=None, n_invoices=5, n_other=5):
+    ocr_engine_pool.warm_up()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if pdf_path is None:
+            pdf_path = os.path.join(tmp_dir, "mixed_bundle.pdf")
+            make_mixed_bundle(pdf_path, n_invoices, n_other)
+
+        full = run(pdf_path, use_triage=False)
+        triaged = run(pdf_path, use_triage=True)
+        print(f"pages: {full.pages}")
+        print(f"without triage: {full.get_elapsed():.2f}s, {full.failed_pages} failed")
+        print(
+            f"with triage: {triaged.get_elapsed():.2f}s, "
+            f"{triaged.skipped_pages} skipped, {triaged.failed_pages} failed"
+        )
+        print(f"triage time: {triaged.triage_time:.2f}s")
+        print(f"estimated OCR time saved: {triaged.get_ocr_time_saved():.2f}s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,31 @@
+import argparse
+
+from pdf_to_json import PDFToOCR
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="record a PDF's OCR results as a benchmark fixture"
+    )
+    arg_parser.add_argument("pdf_path")
+    arg_parser.add_argument("fixture_path", help="e.g. benchmarks/fixtures/name.json")
+    arg_parser.add_argument(
+        "--page-num", type=int, default=0, help="pages to record, 0 for all"
+    )
+    arg_parser.add_argument(
+        "--text-layer",
+        action="store_true",
+        help="record born-digital pages from the PDF text layer instead of OCR",
+    )
+    args = arg_parser.parse_args(argv)
+
+    PDFToOCR(
+        args.pdf_path,
+        page_num=args.page_num,
+        use_cache=False,
+        use_text_layer=args.text_layer,
+    ).save_ocr_results_as_json(args.fixture_path)
+
+
+if __name__ == "__main__":
+    main()
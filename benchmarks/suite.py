@@ -0,0 +1,230 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import timeit
+
+import numpy as np
+
+from benchmarks.synthetic_invoice import make_invoice_page
+from pdf_to_json import PDFToOCR, invoice_parsers, parse_invoice_page
+from profiling import StageProfiler, set_profiler
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+fixtures_dir = os.path.join(benchmarks_dir, "fixtures")
+default_baseline_path = os.path.join(benchmarks_dir, "baseline.json")
+
+# synthetic pages scaling line items and box counts: (n_items, n_noise)
+synthetic_cases = {
+    "synthetic_10_items": (10, 0),
+    "synthetic_200_items": (200, 0),
+    "synthetic_50_items_2000_noise": (50, 2000),
+}
+
+
+def load_cases(fixture_paths):
+    # recorded OCR fixtures go through the same from_json path as saved
+    # PaddleOCR results, so no OCR models are needed
+    cases = {}
+    for fixture_path in fixture_paths:
+        name = os.path.splitext(os.path.basename(fixture_path))[0]
+        cases["fixture_" + name] = PDFToOCR(
+            from_json=True, ocr_json_path=fixture_path
+        ).ocr_results
+    for name, (n_items, n_noise) in synthetic_cases.items():
+        cases[name] = [make_invoice_page(n_items, n_noise)]
+    return cases
+
+
+# the calibration workload is timed this many times
+rounds = 9
+# the only stage whose time fails the suite
+gated_time_stage = "end_to_end"
+
+
+def calibration_workload():
+    sorted(range(20000, 0, -1))
+    {i: str(i) for i in range(5000)}
+    np.sort(np.random.default_rng(0).random(20000))
+
+
+def calibrate():
+    # time of a fixed Python + NumPy workload, taken right before each case so
+    # comparisons can discount machines (or shared CPUs) running faster or
+    # slower than when the baseline was recorded. The median, like the case
+    # timings, so both are affected by noise the same way
+    return statistics.median(
+        timeit.repeat(calibration_workload, number=5, repeat=rounds)
+    )
+
+
+def measure_case(pages, parser, repeat):
+    # per-method and end-to-end parse time: the median of every repeat for
+    # each page, averaged over pages. One slow repeat (a context switch, a
+    # garbage collection) moves the median much less than the mean or min.
+    # Then peak memory from one pass with memory tracing on
+    for page in pages:
+        parse_invoice_page(page, parser=parser)
+    profiler = set_profiler(StageProfiler())
+    for _ in range(repeat):
+        for page_index, page in enumerate(pages):
+            with profiler.stage("end_to_end", page_index):
+                parse_invoice_page(page, parser=parser)
+    page_times = {}
+    for record in profiler.take_records():
+        times = page_times.setdefault(record["stage"], {})
+        times.setdefault(record["page"], []).append(record["wall_time"])
+
+    profiler = set_profiler(StageProfiler(track_memory=True))
+    for page in pages:
+        with profiler.stage("end_to_end"):
+            parse_invoice_page(page, parser=parser)
+    stage_memory = {}
+    for record in profiler.take_records():
+        stage_memory[record["stage"]] = max(
+            stage_memory.get(record["stage"], 0), record["peak_memory"]
+        )
+    set_profiler(None)
+
+    return {
+        stage: {
+            "time": statistics.mean(
+                statistics.median(times) for times in times.values()
+            ),
+            "peak_memory": stage_memory.get(stage),
+        }
+        for stage, times in page_times.items()
+    }
+
+
+def run_suite(cases, parsers, repeat):
+    results = {}
+    for case_name, pages in cases.items():
+        for parser in parsers:
+            calibration = calibrate()
+            for stage, metrics in measure_case(pages, parser, repeat).items():
+                metrics["calibration"] = calibration
+                results[f"{case_name}/{parser}/{stage}"] = metrics
+    return results
+
+
+def find_regressions(results, baseline, threshold, min_time):
+    # only end-to-end times are gated: per-method stages run for fractions of
+    # a millisecond, where scheduler noise alone exceeds any threshold, so
+    # they are reported but not compared. Baseline times are scaled by the
+    # run's speed ratio; differences below min_time seconds are ignored.
+    # Peak memory is deterministic and gated for every stage. Returns
+    # {key: description}
+    regressions = {}
+    # one speed ratio for the whole run, the median over every case's
+    # calibration, as a single calibration varies as much as the cases do
+    speed_ratio = statistics.median(
+        metrics["calibration"] / baseline[key]["calibration"]
+        for key, metrics in results.items()
+        if key in baseline
+    )
+    for key, metrics in results.items():
+        if key not in baseline:
+            continue
+        base_metrics = baseline[key]
+        base_time, time = base_metrics["time"] * speed_ratio, metrics["time"]
+        if (
+            key.endswith("/" + gated_time_stage)
+            and time > base_time * (1 + threshold)
+            and time - base_time > min_time
+        ):
+            regressions[key] = (
+                f"{key}: time {base_time * 1000:.3f}ms -> {time * 1000:.3f}ms"
+            )
+        base_memory, memory = base_metrics["peak_memory"], metrics["peak_memory"]
+        if base_memory and memory and memory > base_memory * (1 + threshold):
+            regressions[key] = f"{key}: peak memory {base_memory} -> {memory} bytes"
+    return regressions
+
+
+def remeasure_regressions(results, regressions, cases, repeat):
+    # a slowdown has to show up twice to count: the flagged cases are run
+    # again and each keeps the faster of its two times
+    flagged = {tuple(key.split("/")[:2]) for key in regressions}
+    for case_name, parser in sorted(flagged):
+        rerun = run_suite({case_name: cases[case_name]}, [parser], repeat)
+        for key, metrics in rerun.items():
+            results[key]["time"] = min(results[key]["time"], metrics["time"])
+
+
+def print_results(results):
+    print(f"{'case/parser/stage':<72} {'time':>10} {'peak memory':>12}")
+    for key, metrics in results.items():
+        memory = metrics["peak_memory"]
+        memory = "" if memory is None else f"{memory / 1024:.0f} KiB"
+        print(f"{key:<72} {metrics['time'] * 1000:>8.3f}ms {memory:>12}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description="benchmark the parsing layer on recorded and synthetic pages"
+    )
+    arg_parser.add_argument(
+        "fixtures", nargs="*", help="OCR JSON fixtures, all in fixtures/ by default"
+    )
+    arg_parser.add_argument(
+        "--parser", choices=sorted(invoice_parsers), action="append", default=None
+    )
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--baseline", default=default_baseline_path)
+    arg_parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="record this run as the baseline instead of comparing against it",
+    )
+    arg_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.3,
+        help="fail when a time or peak memory grows by more than this fraction",
+    )
+    arg_parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.001,
+        help="ignore end-to-end slowdowns smaller than this many seconds",
+    )
+    args = arg_parser.parse_args(argv)
+
+    fixture_paths = [os.path.abspath(path) for path in args.fixtures] or sorted(
+        glob.glob(os.path.join(fixtures_dir, "*.json"))
+    )
+    baseline_path = os.path.abspath(args.baseline)
+    cases = load_cases(fixture_paths)
+    results = run_suite(cases, args.parser or sorted(invoice_parsers), args.repeat)
+    print_results(results)
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(
+            f"no baseline at {baseline_path}, record one with --save-baseline",
+            file=sys.stderr,
+        )
+        return 1
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline, args.threshold, args.min_time)
+    if regressions:
+        remeasure_regressions(results, regressions, cases, args.repeat)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_time)
+    for regression in regressions.values():
+        print("REGRESSION " + regression)
+    if regressions:
+        return 1
+    print(f"no regressions beyond {args.threshold:.0%} against {baseline_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
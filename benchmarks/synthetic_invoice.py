@@ -0,0 +1,103 @@
+import random
+
+
+def make_box(x0, y0, x1, y1, text, score=0.99):
+    return [
+        [
+            [float(x0), float(y0)],
+            [float(x1), float(y0)],
+            [float(x1), float(y1)],
+            [float(x0), float(y1)],
+        ],
+        (text, score),
+    ]
+
+
+def make_invoice_page(n_items=10, n_noise=0, page_number=1, seed=0):
+    # builds one page in the [bbox, (text, score)] shape PaddleOCR returns,
+    # laid out like a Singapore General Hospital tax invoice
+    rng = random.Random(seed)
+    page = [
+        make_box(100, 40, 300, 60, "SINGAPORE GENERAL"),
+        make_box(310, 40, 400, 60, "HOSPITAL"),
+        make_box(500, 80, 640, 100, "TAX INVOICE"),
+        make_box(60, 120, 360, 140, "GST REG NO: M90367270"),
+        make_box(700, 120, 800, 140, "ORIGINAL"),
+        make_box(60, 150, 300, 170, f"12.03.2021 Page/{page_number}"),
+    ]
+
+    key_info = [
+        ("Tax Invoice Number", ": 9001234%d" % page_number),
+        ("Bill Ref Number", ": B55012"),
+        ("Patient NRICI/HRN", ": S1234567D"),
+        ("Visit Date", ": 01.03.2021"),
+        ("Visit/Bill Location", ": Ward 57"),
+        ("Payment Class", ": B2"),
+        ("Type of Supply", ": Standard Rated"),
+    ]
+    y = 200
+    for label, value in key_info:
+        page.append(make_box(60, y, 260, y + 20, label))
+        page.append(make_box(270, y, 420, y + 20, value))
+        y += 25
+
+    y += 40
+    page.append(make_box(60, y, 180, y + 20, "SERVICE CODE"))
+    page.append(make_box(200, y, 320, y + 20, "DESCRIPTION"))
+    page.append(make_box(700, y, 800, y + 20, "QUANTITY"))
+    page.append(make_box(900, y, 990, y + 20, "AMOUNT"))
+    y += 30
+
+    subtotal = 0
+    for i in range(n_items):
+        cents = rng.randint(100, 99999)
+        subtotal += cents
+        jitter = rng.uniform(-2, 2)
+        page.append(make_box(60, y, 150, y + 20, "S%05d" % i))
+        page.append(
+            make_box(200, y + jitter, 560, y + 20 + jitter, "SERVICE ITEM %d FEE" % i)
+        )
+        page.append(
+            make_box(720, y + jitter, 740, y + 20 + jitter, str(rng.randint(1, 9)))
+        )
+        page.append(
+            make_box(
+                900, y + jitter, 980, y + 20 + jitter, "%d.%02d" % divmod(cents, 100)
+            )
+        )
+        y += 25
+
+    page.append(make_box(620, y, 850, y + 20, "Subtotal Charges"))
+    page.append(make_box(900, y, 990, y + 20, "%d.%02d" % divmod(subtotal, 100)))
+    y += 40
+
+    gst = subtotal * 7 // 100
+    payments = [
+        ("Total Payable", subtotal + gst),
+        ("GST 7%", gst),
+        ("AMOUNT PAYABLE AFTER TAX", subtotal + gst),
+        ("Less: Medisave", 10000),
+        ("NET AMOUNT PAYABLE", subtotal + gst - 10000),
+    ]
+    for label, cents in payments:
+        page.append(make_box(60, y, 400, y + 20, label))
+        page.append(
+            make_box(900, y, 990, y + 20, "{:,}.{:02d}".format(*divmod(cents, 100)))
+        )
+        y += 25
+
+    y += 40
+    for i in range(n_noise):
+        x = 60 + (i % 4) * 250
+        page.append(make_box(x, y, x + 230, y + 18, "remark line %d lorem ipsum" % i))
+        if i % 4 == 3:
+            y += 22
+
+    return page
+
+
+def make_invoice_document(n_pages=2, n_items=10, n_noise=0, seed=0):
+    return [
+        make_invoice_page(n_items, n_noise, page_number=i + 1, seed=seed + i)
+        for i in range(n_pages)
+    ]
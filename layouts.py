@@ -0,0 +1,287 @@
+import functools
+import re
+
+import numpy as np
+
+# a layout template describes one invoice layout as plain data (JSON
+# compatible), so adding a hospital means adding a template, not code:
+# - hospital_names: the names, as printed in the header, that use the layout
+# - anchors: every text pattern the region extractors look up
+# - key_info_fields: the field names of the key info box
+# - regions: the bounding box of each region, one rule per edge
+# - table_columns: the invoice table's columns, left to right. Each has the
+#   name of its field in the line items, the header anchor to leave out (or
+#   none) and the kind of its cells: "text" as read, "digits" keeping only
+#   the digits or "amount" in cents, cells without digits being dropped. The
+#   first column's cells make the rows the other columns are aligned to
+# - table_column_borders: the left edge of every table column but the first,
+#   looked up within the invoice table region
+# - stop_region: the lowest region the parser reads. Its bottom edge must be
+#   an anchor rule; region of interest OCR stops recognizing at that anchor's
+#   line (its last one for anchors_max, as the region does)
+#
+# an edge rule is [value, margin]: the value moved out by one (page scaled)
+# margin, -1 subtracting it, 1 adding it and 0 leaving the value as is.
+# Values are
+# - ["anchor", anchor, column]: the column of the anchor's first box
+# - ["page_min" | "page_max", column]: over every box on the page
+# - ["anchors_min" | "anchors_max", anchor, column]: over every box of the
+#   anchor, within the region when there is one
+# - ["between_max", first_anchor, last_anchor, column]: over the boxes from
+#   the first anchor's first box up to the last anchor's
+# - ["min" | "max", value, value]
+sgh_layout = {
+    "name": "sgh",
+    "hospital_names": ["Singapore General Hospital", "Tan Tock Seng Hospital"],
+    "anchors": {
+        "TAX INVOICE": "TAX INVOICE",
+        "GST REG NO": "GST REG NO",
+        "Bill Type": "ORIGINAL|DUPLICATE|INTERIM",
+        "Page": "Page",
+        "Tax Invoice Number": "Tax Invoice Number",
+        "Type of Supply": "Type of Supply",
+        "SERVICE CODE": "SERVICE CODE",
+        "DESCRIPTION": "DESCRIPTION",
+        "QUANTITY": "QUANTITY",
+        "AMOUNT": "AMOUNT",
+        "Subtotal": "Subtotal",
+        "Subtotal Charges": "Subtotal Charges",
+        "Total Payable": r"Total[A-z\s]*le",
+        "NET AMOUNT PAYABLE": "NET AMOUNT PAYABLE",
+    },
+    "key_info_fields": [
+        "Tax Invoice Number",
+        "Bill Ref Number",
+        "Tax Invoice Date",
+        "Patient NRICI/HRN",
+        "Visit Date",
+        "Visit/Bill Location",
+        "Payment Class",
+        "Type of Supply",
+        "GST Reg No",
+        "Page No",
+        "Bill Type",
+    ],
+    "regions": {
+        "gst_to_page_number": {
+            "left": [["page_min", "bbox_upper_left_x"], -1],
+            "top": [["anchor", "TAX INVOICE", "bbox_lower_left_y"], 1],
+            "right": [["page_max", "bbox_lower_right_x"], 1],
+            "bottom": [["anchor", "Tax Invoice Number", "bbox_upper_left_y"], 1],
+        },
+        "key_info": {
+            "left": [["anchor", "Tax Invoice Number", "bbox_upper_left_x"], -1],
+            "top": [["anchor", "Tax Invoice Number", "bbox_upper_left_y"], -1],
+            "right": [
+                [
+                    "between_max",
+                    "Tax Invoice Number",
+                    "Type of Supply",
+                    "bbox_lower_right_x",
+                ],
+                1,
+            ],
+            "bottom": [["anchor", "Type of Supply", "bbox_lower_right_y"], 1],
+        },
+        "invoice_table": {
+            "left": [["anchor", "SERVICE CODE", "bbox_upper_left_x"], -1],
+            "top": [
+                [
+                    "min",
+                    ["anchor", "SERVICE CODE", "bbox_upper_left_y"],
+                    ["anchor", "AMOUNT", "bbox_upper_right_y"],
+                ],
+                -1,
+            ],
+            "right": [["page_max", "bbox_upper_right_x"], 1],
+            "bottom": [["anchor", "Subtotal Charges", "bbox_lower_right_y"], 1],
+        },
+        "payment_info": {
+            "left": [["page_min", "bbox_upper_left_x"], -1],
+            "top": [["anchor", "Total Payable", "bbox_lower_left_y"], -1],
+            "right": [["page_max", "bbox_lower_right_x"], 1],
+            "bottom": [
+                ["anchors_max", "NET AMOUNT PAYABLE", "bbox_lower_right_y"],
+                1,
+            ],
+        },
+    },
+    "table_columns": [
+        {"name": "item_code", "header": "SERVICE CODE", "cells": "text"},
+        {"name": "item_description", "header": "DESCRIPTION", "cells": "text"},
+        {"name": "item_quantity", "header": None, "cells": "digits"},
+        {"name": "item_amount", "header": None, "cells": "amount"},
+    ],
+    "table_column_borders": [
+        [["anchors_min", "DESCRIPTION", "bbox_upper_left_x"], -1],
+        [["anchors_min", "QUANTITY", "bbox_upper_left_x"], -1],
+        [["anchors_max", "Subtotal", "bbox_upper_right_x"], 1],
+    ],
+    "stop_region": "payment_info",
+}
+
+
+table_cell_kinds = ("text", "digits", "amount")
+
+
+def array_min(values):
+    # NaN for an empty selection, like pandas, instead of numpy's ValueError
+    return values.min() if len(values) else np.nan
+
+
+def array_max(values):
+    return values.max() if len(values) else np.nan
+
+
+@functools.lru_cache(maxsize=None)
+def compile_anchor_patterns(anchor_patterns):
+    anchor_regexes = tuple(
+        (anchor, re.compile(pattern)) for anchor, pattern in anchor_patterns
+    )
+    combined_regex = re.compile(
+        "|".join(f"(?:{pattern})" for _, pattern in anchor_patterns)
+    )
+    return anchor_regexes, combined_regex
+
+
+def compile_value_rule(rule):
+    # turns a value rule into a function of (parser, region)
+    kind = rule[0]
+    if kind == "anchor":
+        _, anchor, column = rule
+        return lambda parser, region: parser.get_anchor_value(anchor, column)
+    if kind in ("page_min", "page_max"):
+        _, column = rule
+        reduce = array_min if kind == "page_min" else array_max
+        return lambda parser, region: reduce(parser.get_column_values(column))
+    if kind in ("anchors_min", "anchors_max"):
+        _, anchor, column = rule
+        reduce = array_min if kind == "anchors_min" else array_max
+        return lambda parser, region: reduce(
+            parser.get_column_values(column)[parser.get_anchor_rows(anchor, region)]
+        )
+    if kind == "between_max":
+        _, first_anchor, last_anchor, column = rule
+
+        def between_max(parser, region):
+            anchor_index = parser.get_anchor_index()
+            first_row = anchor_index.get_first_row(first_anchor)
+            last_row = anchor_index.get_first_row(last_anchor)
+            return array_max(parser.get_column_values(column)[first_row:last_row])
+
+        return between_max
+    if kind in ("min", "max"):
+        values = [compile_value_rule(value_rule) for value_rule in rule[1:]]
+        reduce = min if kind == "min" else max
+        return lambda parser, region: reduce(value(parser, region) for value in values)
+    raise ValueError(f"unknown layout rule {kind!r}")
+
+
+def compile_edge_rule(edge_rule):
+    value_rule, margin = edge_rule
+    value = compile_value_rule(value_rule)
+    if margin < 0:
+        return lambda parser, region: value(parser, region) - parser.get_margin()
+    if margin > 0:
+        return lambda parser, region: value(parser, region) + parser.get_margin()
+    return value
+
+
+def get_stop_rule(template):
+    # (anchor pattern, whether its last box ends the region) of the stop
+    # region's bottom edge, or (None, False) without a stop region
+    stop_region = template.get("stop_region")
+    if stop_region is None:
+        return None, False
+    value_rule = template["regions"][stop_region]["bottom"][0]
+    if value_rule[0] not in ("anchor", "anchors_min", "anchors_max"):
+        raise ValueError(
+            f"the bottom edge of the stop region {stop_region!r} is not an anchor rule"
+        )
+    return template["anchors"][value_rule[1]], value_rule[0] == "anchors_max"
+
+
+class ExtractionPlan:
+    # a layout template compiled once: anchor regexes for the page's single
+    # anchor scan, and every region edge as a ready-made function
+    edges = ("left", "top", "right", "bottom")
+
+    def __init__(self, template):
+        self.name = template["name"]
+        self.hospital_names = list(template["hospital_names"])
+        self.key_info_fields = list(template["key_info_fields"])
+        self.anchor_patterns = dict(template["anchors"])
+        self.anchor_regexes, self.combined_regex = compile_anchor_patterns(
+            tuple(self.anchor_patterns.items())
+        )
+        self.region_edges = {
+            region: tuple(compile_edge_rule(rules[edge]) for edge in self.edges)
+            for region, rules in template["regions"].items()
+        }
+        self.column_border_edges = tuple(
+            compile_edge_rule(edge_rule)
+            for edge_rule in template["table_column_borders"]
+        )
+        self.table_columns = [
+            {
+                "name": column["name"],
+                "header": column.get("header"),
+                "cells": column.get("cells", "text"),
+            }
+            for column in template["table_columns"]
+        ]
+        if len(self.table_columns) != len(self.column_border_edges) + 1:
+            raise ValueError(
+                f"layout {self.name!r} has {len(self.table_columns)} table "
+                f"columns but {len(self.column_border_edges)} column borders"
+            )
+        for column in self.table_columns:
+            if column["cells"] not in table_cell_kinds:
+                raise ValueError(f"unknown table cell kind {column['cells']!r}")
+        self.stop_pattern, self.stop_at_last = get_stop_rule(template)
+
+    def get_region_bbox(self, region, parser):
+        # (upper_left_x, upper_left_y, lower_right_x, lower_right_y)
+        return tuple(edge(parser, None) for edge in self.region_edges[region])
+
+    def get_column_borders(self, parser, region):
+        return tuple(edge(parser, region) for edge in self.column_border_edges)
+
+
+class LayoutRegistry:
+    # extraction plans by hospital name. The hospital name is read from the
+    # page header before any template is chosen, then selects its plan with a
+    # dict lookup, so templates for other hospitals cost nothing per page
+    def __init__(self, hospital_pattern="(?i:hospital)"):
+        self.hospital_regex = re.compile(hospital_pattern)
+        self.plans = {}
+        self.default_plan = None
+
+    def register(self, template):
+        plan = ExtractionPlan(template)
+        for hospital_name in plan.hospital_names:
+            self.plans[hospital_name.title()] = plan
+        if self.default_plan is None:
+            self.default_plan = plan
+        return plan
+
+    def get_plan(self, hospital_name):
+        try:
+            return self.plans[hospital_name]
+        except KeyError:
+            raise ValueError("Hospital name not found") from None
+
+    def get_hospital_names(self):
+        return list(self.plans)
+
+    def find_hospital_row(self, texts):
+        # the first box mentioning "hospital"; it sits at the top of the page,
+        # so the scan stops early
+        for row, text in enumerate(texts):
+            if self.hospital_regex.search(text) is not None:
+                return row
+        raise IndexError("no hospital name on the page")
+
+
+layout_registry = LayoutRegistry()
+layout_registry.register(sgh_layout)
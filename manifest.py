@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ocr_cache import hash_file
+from sinks import InvoiceSink, encode_json
+
+# stages after which a page needs no more work on a restarted run
+completed_stages = ("written", "skipped")
+
+
+class BatchManifest:
+    # append-only JSON Lines log of batch progress: one record per page and
+    # stage reached (ocr, parsed, skipped, failed, written) with the document
+    # hash, output location and timings. Documents are keyed by content hash,
+    # so a renamed or moved PDF still resumes. Each record is a single
+    # O_APPEND write under an exclusive lock, so worker processes can append
+    # to the same file concurrently without interleaving lines
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.lock = threading.Lock()
+        self.document_hashes = {}
+
+    def get_document_hash(self, pdf_path):
+        if pdf_path not in self.document_hashes:
+            self.document_hashes[pdf_path] = hash_file(pdf_path)
+        return self.document_hashes[pdf_path]
+
+    def append(self, document_hash, page_index, stage, **fields):
+        record = {
+            "document_hash": document_hash,
+            "page_index": page_index,
+            "stage": stage,
+            "time": time.time(),
+        }
+        record.update(fields)
+        line = encode_json(record) + b"\n"
+        with self.lock:
+            if self.fd is None:
+                self.fd = os.open(
+                    self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+                )
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                os.write(self.fd, line)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def read_records(self):
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # a line cut short by a crash mid-write
+                    continue
+        return records
+
+    def get_completed_pages(self):
+        # {(document_hash, page_index)} of pages finished by earlier runs
+        return {
+            (record["document_hash"], record["page_index"])
+            for record in self.read_records()
+            if record.get("stage") in completed_stages
+        }
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+
+class CheckpointSink(InvoiceSink):
+    # records a "written" manifest entry for each page once the wrapped sink
+    # has written it out; for sinks that write a document at a time
+    # (buffered), the entries are recorded when the document ends
+    def __init__(self, sink, manifest):
+        self.sink = sink
+        self.manifest = manifest
+        self.pending = {}
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        self.sink.write(invoice_json, pdf_path, page_index)
+        if self.sink.buffered:
+            self.pending.setdefault(pdf_path, []).append(page_index)
+        else:
+            self.record_written(pdf_path, page_index)
+
+    def end_document(self, pdf_path):
+        self.sink.end_document(pdf_path)
+        for page_index in self.pending.pop(pdf_path, []):
+            self.record_written(pdf_path, page_index)
+
+    def recover_written_pages(self, pages):
+        # records pages found in the output whose "written" entry was lost
+        # to a crash between writing the page and recording it, so a resumed
+        # run does not write them twice
+        completed_pages = self.manifest.get_completed_pages()
+        for pdf_path, page_index in pages:
+            if pdf_path is None or not os.path.exists(pdf_path):
+                continue
+            document_hash = self.manifest.get_document_hash(pdf_path)
+            if (document_hash, page_index) not in completed_pages:
+                self.record_written(pdf_path, page_index)
+
+    def record_written(self, pdf_path, page_index):
+        self.manifest.append(
+            self.manifest.get_document_hash(pdf_path),
+            page_index,
+            "written",
+            pdf_path=pdf_path,
+            output=self.sink.get_output_location(pdf_path),
+        )
+
+    def close(self):
+        self.sink.close()
+        for pdf_path, page_indexes in self.pending.items():
+            for page_index in page_indexes:
+                self.record_written(pdf_path, page_index)
+        self.pending = {}
@@ -0,0 +1,158 @@
+import os
+import sys
+import warnings
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+# an OCR backend is a factory returning an engine with PaddleOCR's interface:
+# ocr(page_image, cls=True), the text_detector, text_classifier and
+# text_recognizer steps (which roi_ocr and the batched service drive
+# directly), and the use_angle_cls and drop_score settings. Every factory
+# takes the same CPU tuning options; None keeps the library's default:
+# - cpu_threads: intra-op threads per engine. With several worker processes,
+#   processes x cpu_threads should not exceed the machine's cores
+# - enable_mkldnn: oneDNN (MKL-DNN) kernels for x86 CPUs
+# - rec_batch_num: text crops per recognizer call
+# - model_dir: locally exported models, in det/, rec/ and cls/ subdirectories
+#   for Paddle or as det.onnx, rec.onnx and cls.onnx for ONNX Runtime
+
+
+# OpenMP and BLAS read these once, when the library using them loads
+native_thread_variables = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# modules whose native thread pools are sized from native_thread_variables
+native_thread_modules = ("numpy", "paddle", "onnxruntime")
+
+
+def set_native_thread_variables(cpu_threads):
+    # for processes started afterwards, e.g. spawned batch workers, where they
+    # are in place before anything loads
+    for name in native_thread_variables:
+        os.environ[name] = str(cpu_threads)
+
+
+def limit_native_threads(cpu_threads):
+    # libraries loaded from here on read the variables; ones already loaded
+    # are limited through threadpoolctl when it is installed, and otherwise
+    # keep their own thread count, with a warning
+    if cpu_threads is None:
+        return
+    if all(
+        os.environ.get(name) == str(cpu_threads) for name in native_thread_variables
+    ):
+        # set before the process started, or by an earlier engine
+        return
+    set_native_thread_variables(cpu_threads)
+    loaded = [module for module in native_thread_modules if module in sys.modules]
+    if not loaded:
+        return
+    if threadpoolctl is not None:
+        threadpoolctl.threadpool_limits(cpu_threads)
+        return
+    warnings.warn(
+        f"cpu_threads={cpu_threads} does not apply to the thread pools of "
+        f"{', '.join(loaded)}, loaded before it was set; install threadpoolctl "
+        f"or set {', '.join(native_thread_variables)} before starting Python",
+        RuntimeWarning,
+        stacklevel=2,
+    )
+
+
+def create_paddle_engine(
+    use_angle_cls=True,
+    lang="en",
+    cpu_threads=None,
+    enable_mkldnn=None,
+    rec_batch_num=None,
+    model_dir=None,
+):
+    limit_native_threads(cpu_threads)
+    # imported on first use, so parsing recorded OCR results works without
+    # PaddleOCR installed
+    from paddleocr import PaddleOCR
+
+    options = {}
+    if cpu_threads is not None:
+        options["cpu_threads"] = cpu_threads
+    if enable_mkldnn is not None:
+        options["enable_mkldnn"] = enable_mkldnn
+    if rec_batch_num is not None:
+        options["rec_batch_num"] = rec_batch_num
+    if model_dir is not None:
+        options["det_model_dir"] = os.path.join(model_dir, "det")
+        options["rec_model_dir"] = os.path.join(model_dir, "rec")
+        options["cls_model_dir"] = os.path.join(model_dir, "cls")
+    return PaddleOCR(use_angle_cls=use_angle_cls, lang=lang, **options)
+
+
+def create_onnx_session(model_path, cpu_threads=None, enable_mkldnn=None):
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if cpu_threads is not None:
+        session_options.intra_op_num_threads = cpu_threads
+    # the detector, classifier and recognizer run one after another, so
+    # parallelism between operators only adds threads
+    session_options.inter_op_num_threads = 1
+    session_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    providers = ["CPUExecutionProvider"]
+    if enable_mkldnn and "DnnlExecutionProvider" in (
+        onnxruntime.get_available_providers()
+    ):
+        providers.insert(0, "DnnlExecutionProvider")
+    return onnxruntime.InferenceSession(
+        model_path, sess_options=session_options, providers=providers
+    )
+
+
+def create_onnx_engine(
+    use_angle_cls=True,
+    lang="en",
+    cpu_threads=None,
+    enable_mkldnn=None,
+    rec_batch_num=None,
+    model_dir=None,
+):
+    # PaddleOCR's pre- and post-processing around ONNX Runtime sessions of
+    # models exported with paddle2onnx
+    if model_dir is None:
+        raise ValueError(
+            "the onnx backend needs model_dir holding det.onnx, rec.onnx and cls.onnx"
+        )
+    limit_native_threads(cpu_threads)
+    from paddleocr import PaddleOCR
+
+    model_paths = {
+        step: os.path.join(model_dir, step + ".onnx") for step in ("det", "rec", "cls")
+    }
+    options = {}
+    if rec_batch_num is not None:
+        options["rec_batch_num"] = rec_batch_num
+    ocr_engine = PaddleOCR(
+        use_angle_cls=use_angle_cls,
+        lang=lang,
+        use_onnx=True,
+        det_model_dir=model_paths["det"],
+        rec_model_dir=model_paths["rec"],
+        cls_model_dir=model_paths["cls"],
+        **options,
+    )
+    # PaddleOCR opens its sessions with ONNX Runtime's default threading, so
+    # they are reopened with the requested threads and execution provider
+    for step, predictor_name in (
+        ("det", "text_detector"),
+        ("rec", "text_recognizer"),
+        ("cls", "text_classifier"),
+    ):
+        predictor = getattr(ocr_engine, predictor_name, None)
+        if predictor is None:
+            continue
+        session = create_onnx_session(model_paths[step], cpu_threads, enable_mkldnn)
+        predictor.predictor = session
+        predictor.input_tensor = session.get_inputs()[0]
+    return ocr_engine
+
+
+ocr_backends = {"paddle": create_paddle_engine, "onnx": create_onnx_engine}
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    entry_suffix = ".json"
+
+    def __init__(self, cache_dir=".ocr_cache", max_size_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size_bytes = None
+        self.lock = threading.Lock()
+
+    def make_key(self, pdf_hash, page_index, ocr_config):
+        config = json.dumps(ocr_config, sort_keys=True)
+        return hashlib.sha256(
+            f"{pdf_hash}:{page_index}:{config}".encode("utf-8")
+        ).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + self.entry_suffix)
+
+    def read_entry(self, path):
+        with open(path, "r") as f:
+            return json.load(f)["results"]
+
+    def write_entry(self, fd, page):
+        with os.fdopen(fd, "w") as f:
+            json.dump({"results": page}, f)
+
+    def get(self, pdf_hash, page_index, ocr_config):
+        path = self.entry_path(self.make_key(pdf_hash, page_index, ocr_config))
+        try:
+            page = self.read_entry(path)
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        # the mtime doubles as the last-used time for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self.lock:
+            self.hits += 1
+        return page
+
+    def put(self, pdf_hash, page_index, ocr_config, page):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(self.make_key(pdf_hash, page_index, ocr_config))
+
+        # write to a temp file in the same directory and rename it into place,
+        # so concurrent workers never read a partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            self.write_entry(fd, page)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            if self.size_bytes is None:
+                self.size_bytes = self.get_disk_usage()
+            else:
+                self.size_bytes += os.path.getsize(path)
+            over_limit = self.size_bytes > self.max_size_bytes
+        if over_limit:
+            self.evict()
+
+    def list_entries(self):
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(self.entry_suffix):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # removed by another worker since the directory was listed
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get_disk_usage(self):
+        return sum(entry_size for _, entry_size, _ in self.list_entries())
+
+    def evict(self):
+        # other workers share the directory, so re-read the real usage and
+        # drop least recently used entries until back under 90% of the bound
+        entries = sorted(self.list_entries())
+        size_bytes = sum(entry_size for _, entry_size, _ in entries)
+        target_bytes = self.max_size_bytes * 0.9
+        for _, entry_size, path in entries:
+            if size_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size_bytes -= entry_size
+        with self.lock:
+            self.size_bytes = size_bytes
+
+    def clear(self):
+        for _, _, path in self.list_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self.lock:
+            self.size_bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size_bytes": self.size_bytes,
+            }
+
+
+class PageImageCache(OCRResultCache):
+    # rendered page images stored as raw .npy arrays and memory-mapped on read,
+    # so a cached page is neither decoded nor copied until OCR touches it
+    entry_suffix = ".npy"
+
+    def __init__(self, cache_dir=".page_cache", max_size_bytes=2 * 1024 * 1024 * 1024):
+        super().__init__(cache_dir=cache_dir, max_size_bytes=max_size_bytes)
+
+    def read_entry(self, path):
+        return np.load(path, mmap_mode="r")
+
+    def write_entry(self, fd, page_image):
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, page_image)
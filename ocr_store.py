@@ -0,0 +1,192 @@
+import itertools
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# a columnar OCR store holds the OCR results of many pages in one file:
+#   magic (8 bytes) | n_pages, n_boxes, n_text_bytes (3 x uint64)
+#   page_offsets  int64[n_pages + 1]   first box of each page
+#   text_offsets  int64[n_boxes + 1]   first text byte of each box
+#   boxes         float32[n_boxes, 4, 2] quadrilaterals, as PaddleOCR gives
+#   scores        float32[n_boxes]
+#   text_bytes    uint8[n_text_bytes]  UTF-8 texts, back to back
+# all little-endian and aligned, so every column is a zero-copy view of the
+# memory-mapped file
+store_magic = b"OCRCOLS1"
+header_dtype = np.dtype("<u8")
+offset_dtype = np.dtype("<i8")
+coordinate_dtype = np.dtype("<f4")
+
+
+class ColumnarPage:
+    # one page of a store: views of its boxes, scores and text bytes. It reads
+    # like the usual [[bbox, (text, score)], ...] page list, but the parser
+    # takes bbox_array and get_texts() directly
+    def __init__(self, bbox_array, scores, text_offsets, text_bytes):
+        self.bbox_array = bbox_array
+        self.scores = scores
+        self.text_offsets = text_offsets
+        self.text_bytes = text_bytes
+        self.texts = None
+
+    def get_texts(self):
+        if self.texts is None:
+            # one copy of the page's bytes, then a slice per box
+            start = self.text_offsets[0]
+            blob = self.text_bytes[start : self.text_offsets[-1]].tobytes()
+            offsets = (self.text_offsets - start).tolist()
+            self.texts = [
+                blob[begin:end].decode("utf-8")
+                for begin, end in zip(offsets, offsets[1:])
+            ]
+        return self.texts
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return [
+            self.bbox_array[index].tolist(),
+            (self.get_texts()[index], float(self.scores[index])),
+        ]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_list(self):
+        return list(self)
+
+
+class ColumnarOCRStore:
+    # read-only sequence of ColumnarPage, memory-mapped unless mmap is False
+    def __init__(self, path, mmap=True):
+        self.path = path
+        if mmap:
+            data = np.memmap(path, dtype=np.uint8, mode="r")
+        else:
+            data = np.fromfile(path, dtype=np.uint8)
+        if data[: len(store_magic)].tobytes() != store_magic:
+            raise ValueError(f"{path} is not a columnar OCR store")
+        position = len(store_magic)
+        n_pages, n_boxes, n_text_bytes = (
+            data[position : position + 3 * header_dtype.itemsize]
+            .view(header_dtype)
+            .tolist()
+        )
+        position += 3 * header_dtype.itemsize
+
+        def take(dtype, count):
+            nonlocal position
+            end = position + count * dtype.itemsize
+            column = data[position:end].view(dtype)
+            position = end
+            return column
+
+        self.page_offsets = take(offset_dtype, n_pages + 1)
+        self.text_offsets = take(offset_dtype, n_boxes + 1)
+        self.boxes = take(coordinate_dtype, n_boxes * 8).reshape(-1, 4, 2)
+        self.scores = take(coordinate_dtype, n_boxes)
+        self.text_bytes = take(np.dtype(np.uint8), n_text_bytes)
+
+    def __len__(self):
+        return len(self.page_offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("page index out of range")
+        start, end = self.page_offsets[index], self.page_offsets[index + 1]
+        return ColumnarPage(
+            self.boxes[start:end],
+            self.scores[start:end],
+            self.text_offsets[start : end + 1],
+            self.text_bytes,
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_json_pages(self):
+        return [page.to_list() for page in self]
+
+
+def get_page_columns(page):
+    # (N x 4 x 2 float32 boxes, texts) of a page in either form, what the
+    # parsers build their columns from
+    if isinstance(page, ColumnarPage):
+        return page.bbox_array, page.get_texts()
+    bbox_array = np.fromiter(
+        itertools.chain.from_iterable(
+            itertools.chain.from_iterable(box[0] for box in page)
+        ),
+        dtype=coordinate_dtype,
+        count=len(page) * 8,
+    ).reshape(-1, 4, 2)
+    return bbox_array, [box[1][0] for box in page]
+
+
+def get_page_scores(page):
+    if isinstance(page, ColumnarPage):
+        return page.scores
+    return np.fromiter(
+        (box[1][1] for box in page), dtype=coordinate_dtype, count=len(page)
+    )
+
+
+def write_columnar_store(pages, path):
+    # pages may be page lists or ColumnarPage; written to a temp file and
+    # renamed into place, so readers never map a partial store
+    page_sizes, boxes, scores, encoded_texts = [], [], [], []
+    for page in pages:
+        bbox_array, texts = get_page_columns(page)
+        page_sizes.append(len(texts))
+        boxes.append(bbox_array)
+        scores.append(get_page_scores(page))
+        encoded_texts.extend(text.encode("utf-8") for text in texts)
+
+    page_offsets = np.zeros(len(page_sizes) + 1, dtype=offset_dtype)
+    np.cumsum(page_sizes, out=page_offsets[1:])
+    text_offsets = np.zeros(len(encoded_texts) + 1, dtype=offset_dtype)
+    np.cumsum([len(text) for text in encoded_texts], out=text_offsets[1:])
+    n_boxes = int(page_offsets[-1])
+    header = np.array(
+        [len(page_sizes), n_boxes, int(text_offsets[-1])], dtype=header_dtype
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(store_magic)
+            f.write(header.tobytes())
+            f.write(page_offsets.tobytes())
+            f.write(text_offsets.tobytes())
+            for column in (boxes, scores):
+                if column:
+                    f.write(np.concatenate(column).astype(coordinate_dtype).tobytes())
+            f.write(b"".join(encoded_texts))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def convert_json_to_columnar(ocr_json_path, store_path):
+    # from the {"results": [...]} files save_ocr_results_as_json writes
+    with open(ocr_json_path, "r") as f:
+        write_columnar_store(json.load(f)["results"], store_path)
+
+
+def convert_columnar_to_json(store_path, ocr_json_path):
+    with open(ocr_json_path, "w") as f:
+        json.dump({"results": ColumnarOCRStore(store_path).to_json_pages()}, f)
@@ -1,7 +1,304 @@
-from paddleocr import PaddleOCR
+import importlib.metadata
+import fitz
+import numpy as np
 import pandas as pd
+import csv
 import json
+import os
 import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+from layouts import layout_registry
+from ocr_backends import ocr_backends
+from ocr_cache import OCRResultCache, hash_file
+from ocr_store import ColumnarOCRStore, get_page_columns, write_columnar_store
+from profiling import get_profiler
+from roi_ocr import RegionOfInterestOCR, sort_box_order, timed_engine_steps
+from sinks import JSONLinesSink, encode_json
+
+
+class OCREnginePool:
+    def __init__(self):
+        self.engines = {}
+        self.lock = threading.Lock()
+
+    def get_engine(
+        self,
+        use_angle_cls=True,
+        lang="en",
+        roi_mode=False,
+        backend="paddle",
+        **backend_options,
+    ):
+        # models are loaded once per process and config, then shared by every
+        # PDFToOCR job running in that process. backend_options are the CPU
+        # tuning options of ocr_backends (cpu_threads, enable_mkldnn, ...)
+        engine_key = (
+            backend,
+            use_angle_cls,
+            lang,
+            tuple(sorted(backend_options.items())),
+        )
+        with self.lock:
+            if engine_key not in self.engines:
+                self.engines[engine_key] = ocr_backends[backend](
+                    use_angle_cls=use_angle_cls, lang=lang, **backend_options
+                )
+            ocr_engine = self.engines[engine_key]
+        if roi_mode:
+            return RegionOfInterestOCR(ocr_engine)
+        return ocr_engine
+
+    def warm_up(self, **ocr_config):
+        # takes the same options as get_engine; ROI engines wrap the shared
+        # full-page engine, so roi_mode loads the same models
+        self.get_engine(**ocr_config)
+
+    def clear(self):
+        with self.lock:
+            self.engines = {}
+
+
+ocr_engine_pool = OCREnginePool()
+ocr_engine_lock = threading.Lock()
+ocr_result_cache = OCRResultCache()
+
+
+def get_paddleocr_version():
+    try:
+        return importlib.metadata.version("paddleocr")
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def get_render_zoom(page, dpi=None):
+    # without a DPI, mirrors PaddleOCR's own PDF loading: 2x zoom, 1x for
+    # large pages
+    if dpi is not None:
+        return dpi / 72
+    if max(page.rect.width, page.rect.height) * 2 > 2000:
+        return 1
+    return 2
+
+
+def get_rendered_page_height(pdf_path, page_index, dpi=None):
+    with fitz.open(pdf_path) as pdf:
+        page = pdf[page_index]
+        return page.rect.height * get_render_zoom(page, dpi)
+
+
+def render_pdf_page(pdf_path, page_index, dpi=None):
+    # BGR like PaddleOCR's own PDF loading, at its default zoom unless a DPI
+    # is given
+    with fitz.open(pdf_path) as pdf:
+        page = pdf[page_index]
+        zoom = get_render_zoom(page, dpi)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    page_image = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(
+        pixmap.height, pixmap.width, 3
+    )
+    return np.ascontiguousarray(page_image[:, :, ::-1])
+
+
+def group_words_into_phrases(words, phrase_gap):
+    # PaddleOCR boxes hold whole phrases ("NET AMOUNT PAYABLE"), so words of the
+    # same text line are merged unless they are separated by a wide gap
+    phrases = []
+    for x0, y0, x1, y1, text, block_no, line_no, _ in words:
+        if phrases:
+            line_key, rect, texts = phrases[-1]
+            if line_key == (block_no, line_no) and x0 - rect[2] <= phrase_gap * (
+                y1 - y0
+            ):
+                rect[1], rect[2], rect[3] = min(rect[1], y0), x1, max(rect[3], y1)
+                texts.append(text)
+                continue
+        phrases.append(((block_no, line_no), [x0, y0, x1, y1], [text]))
+    return [(rect, " ".join(texts)) for _, rect, texts in phrases]
+
+
+def extract_text_layer_page(
+    pdf_path, page_index, dpi=None, min_words=5, phrase_gap=0.6
+):
+    # born-digital pages: read the embedded text instead of running OCR, in the
+    # same [bbox, (text, score)] shape, pixel coordinates and reading order
+    # PaddleOCR gives. Returns None when the page has no usable text layer
+    with fitz.open(pdf_path) as pdf:
+        page = pdf[page_index]
+        words = page.get_text("words")
+        zoom = get_render_zoom(page, dpi)
+        transform = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+    unmapped_words = sum("\ufffd" in word[4] for word in words)
+    if len(words) < min_words or unmapped_words > len(words) / 10:
+        return None
+
+    boxes, texts = [], []
+    for rect, text in group_words_into_phrases(words, phrase_gap):
+        rect = fitz.Rect(rect) * transform
+        boxes.append(
+            [
+                [rect.x0, rect.y0],
+                [rect.x1, rect.y0],
+                [rect.x1, rect.y1],
+                [rect.x0, rect.y1],
+            ]
+        )
+        texts.append(text)
+    # boxes and texts share indexes, so the texts follow the sorted boxes
+    return [[boxes[i], (texts[i], 1.0)] for i in sort_box_order(boxes)]
+
+
+def run_ocr(ocr_engine, page_image, cls=True, stage_prefix=""):
+    # stage_prefix keeps OCR done for another purpose (e.g. "triage_") apart
+    # from full-page OCR in the profile
+    profiler = get_profiler()
+    # a shared engine is not safe to call from several threads at once
+    with ocr_engine_lock, profiler.stage(stage_prefix + "ocr"):
+        if profiler.enabled and hasattr(ocr_engine, "text_detector"):
+            # detection, classification and recognition are each timed as
+            # their own stage inside the engine's usual ocr() call (ROI
+            # engines time their steps themselves)
+            with timed_engine_steps(ocr_engine, stage_prefix):
+                page_result = ocr_engine.ocr(page_image, cls=cls)[0]
+        else:
+            page_result = ocr_engine.ocr(page_image, cls=cls)[0]
+    return page_result or []
+
+
+class LazyOCRResults:
+    def __init__(
+        self,
+        pdf_path,
+        ocr_engine=None,
+        page_num=0,
+        ocr_config=None,
+        ocr_cache=None,
+        use_text_layer=False,
+        dpi=None,
+        image_cache=None,
+        batched_ocr=False,
+    ):
+        self.pdf_path = pdf_path
+        self.ocr_engine = ocr_engine
+        self.page_num = page_num
+        self.ocr_config = ocr_config or {"use_angle_cls": True, "lang": "en"}
+        self.ocr_cache = ocr_cache
+        self.use_text_layer = use_text_layer
+        self.dpi = dpi
+        self.image_cache = image_cache
+        # pages OCR'd by ocr_page_batch (the async service) rather than the
+        # engine's own ocr(); its results are cached apart, so a document
+        # always gets the output of the pipeline that reads it
+        self.batched_ocr = batched_ocr
+        self.pdf_hash = None
+        self.document_page_count = None
+        self.pages = {}
+        self.engine_calls = 0
+        self.text_layer_pages = 0
+
+    def __len__(self):
+        if self.document_page_count is None:
+            with fitz.open(self.pdf_path) as pdf:
+                self.document_page_count = pdf.page_count
+        if self.page_num == 0:
+            return self.document_page_count
+        return min(self.page_num, self.document_page_count)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("page index out of range")
+        # each page is OCR'd at most once, whatever order it is accessed in
+        if index not in self.pages:
+            self.pages[index] = self.ocr_page(index)
+        return self.pages[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def iter_pages(self):
+        # unlike __iter__, freshly OCR'd pages are not memoized, so memory stays
+        # flat however many pages the document has
+        for index in range(len(self)):
+            if index in self.pages:
+                yield self.pages[index]
+            else:
+                yield self.ocr_page(index)
+
+    def get_cache_config(self):
+        # thread counts don't change the OCR output, so they don't split the
+        # cache
+        cache_config = {
+            key: value for key, value in self.ocr_config.items() if key != "cpu_threads"
+        }
+        if self.batched_ocr:
+            cache_config["batched_ocr"] = True
+        return dict(
+            cache_config, dpi=self.dpi, paddleocr_version=get_paddleocr_version()
+        )
+
+    def get_pdf_hash(self):
+        if self.pdf_hash is None:
+            self.pdf_hash = hash_file(self.pdf_path)
+        return self.pdf_hash
+
+    def render_page(self, index):
+        with get_profiler().stage("render", index):
+            # re-running OCR with other models or settings reuses the rendered
+            # page
+            if self.image_cache is None:
+                return render_pdf_page(self.pdf_path, index, self.dpi)
+            image_config = {"dpi": self.dpi}
+            page_image = self.image_cache.get(self.get_pdf_hash(), index, image_config)
+            if page_image is None:
+                page_image = render_pdf_page(self.pdf_path, index, self.dpi)
+                self.image_cache.put(
+                    self.get_pdf_hash(), index, image_config, page_image
+                )
+            return page_image
+
+    def get_stored_page(self, index):
+        # a page that needs no OCR run: read from the text layer or the cache
+        profiler = get_profiler()
+        if self.use_text_layer:
+            with profiler.stage("text_layer", index):
+                page = extract_text_layer_page(self.pdf_path, index, self.dpi)
+            if page is not None:
+                self.text_layer_pages += 1
+                return page
+
+        if self.ocr_cache is not None:
+            with profiler.stage("ocr_cache_read", index):
+                return self.ocr_cache.get(
+                    self.get_pdf_hash(), index, self.get_cache_config()
+                )
+        return None
+
+    def store_page(self, index, page):
+        if self.ocr_cache is not None:
+            self.ocr_cache.put(
+                self.get_pdf_hash(), index, self.get_cache_config(), page
+            )
+
+    def ocr_page(self, index):
+        page = self.get_stored_page(index)
+        if page is not None:
+            return page
+
+        # the engine is only fetched (and its models loaded) on a cache miss
+        if self.ocr_engine is None:
+            self.ocr_engine = ocr_engine_pool.get_engine(**self.ocr_config)
+        with get_profiler().stage("ocr_page", index):
+            page_image = self.render_page(index)
+            self.engine_calls += 1
+            page = run_ocr(self.ocr_engine, page_image)
+        self.store_page(index, page)
+        return page
 
 
 class PDFToOCR:
@@ -11,24 +308,71 @@ class PDFToOCR:
         from_json=False,
         ocr_json_path=None,
         page_num=2,
+        ocr_engine=None,
+        ocr_config=None,
+        use_cache=True,
+        ocr_cache=None,
+        use_text_layer=False,
+        dpi=None,
+        image_cache=None,
+        from_columnar=False,
+        ocr_columnar_path=None,
     ):
         self.pdf_path = pdf_path
-        if not from_json:
-            self.ocr_engine = PaddleOCR(
-                use_angle_cls=True, lang="en", page_num=page_num
+        self.page_num = page_num
+        self.dpi = dpi
+        self.ocr_config = ocr_config or {"use_angle_cls": True, "lang": "en"}
+        if from_columnar:
+            # memory-mapped, pages are decoded only as they are parsed
+            self.ocr_engine = None
+            self.ocr_cache = None
+            self.ocr_results = ColumnarOCRStore(ocr_columnar_path)
+        elif not from_json:
+            self.ocr_engine = ocr_engine
+            if use_cache and ocr_cache is None:
+                ocr_cache = ocr_result_cache
+            self.ocr_cache = ocr_cache if use_cache else None
+
+            # nothing is OCR'd until a page is first accessed
+            self.ocr_results = LazyOCRResults(
+                self.pdf_path,
+                ocr_engine=self.ocr_engine,
+                page_num=self.page_num,
+                ocr_config=self.ocr_config,
+                ocr_cache=self.ocr_cache,
+                use_text_layer=use_text_layer,
+                dpi=self.dpi,
+                image_cache=image_cache,
             )
-
-            self.ocr_results = self.ocr_engine.ocr(self.pdf_path, cls=True)
         else:
             self.ocr_engine = None
+            self.ocr_cache = None
             self.ocr_results = self.load_ocr_results_from_json(ocr_json_path)
 
-    def perform_ocr(self):
-        self.ocr_results = self.ocr_engine.ocr(self.pdf_path, cls=True)
+    def perform_ocr(self, page_num=None):
+        if page_num is not None:
+            self.page_num = page_num
+            self.ocr_results.page_num = page_num
+        return self.ocr_results[:]
+
+    def iter_pages(self):
+        if isinstance(self.ocr_results, LazyOCRResults):
+            return self.ocr_results.iter_pages()
+        return iter(self.ocr_results)
+
+    def get_page_height(self, page_index):
+        # rendered height in pixels, which the parser scales its thresholds by;
+        # unknown for results loaded from JSON or a columnar store
+        if self.pdf_path is None or not isinstance(self.ocr_results, LazyOCRResults):
+            return None
+        return get_rendered_page_height(self.pdf_path, page_index, self.dpi)
+
+    def save_ocr_results_as_json(self, ocr_json_path="ocr_results.json"):
+        with open(ocr_json_path, "w") as f:
+            json.dump({"results": [list(page) for page in self.ocr_results]}, f)
 
-    def save_ocr_results_as_json(self):
-        with open("ocr_results.json", "w") as f:
-            json.dump({"results": self.ocr_results}, f)
+    def save_ocr_results_as_columnar(self, ocr_columnar_path="ocr_results.ocrc"):
+        write_columnar_store(self.ocr_results, ocr_columnar_path)
 
     def load_ocr_results_from_json(self, ocr_json_path):
         with open(ocr_json_path, "r") as f:
@@ -40,82 +384,298 @@ class PDFToOCR:
             page_df.to_csv(f"page_{i}.csv", index=False)
 
 
+class AnchorIndex:
+    def __init__(self, texts, layout):
+        combined_regex = layout.combined_regex
+        anchor_rows = {anchor: [] for anchor in layout.anchor_patterns}
+        # one combined scan over the page for the layout's compiled patterns;
+        # only the few texts that match some anchor are then checked against
+        # each pattern individually
+        for row, text in enumerate(texts):
+            if combined_regex.search(text) is None:
+                continue
+            for anchor, regex in layout.anchor_regexes:
+                if regex.search(text) is not None:
+                    anchor_rows[anchor].append(row)
+        self.anchor_rows = {
+            anchor: np.array(rows, dtype=np.intp)
+            for anchor, rows in anchor_rows.items()
+        }
+
+    def get_rows(self, anchor):
+        return self.anchor_rows[anchor]
+
+    def get_first_row(self, anchor):
+        # raises IndexError when the anchor is not on the page, as the
+        # previous .values[0] lookups did
+        return self.anchor_rows[anchor][0]
+
+
+class SpatialIndex:
+    def __init__(self, bbox_array):
+        self.upper_left = bbox_array[:, 0, :]
+        self.lower_right = bbox_array[:, 2, :]
+        # boxes sorted by their top edge; a rectangle query is a binary search
+        # on that edge followed by an exact check of the few candidates
+        self.order = np.argsort(self.upper_left[:, 1], kind="stable")
+        self.sorted_upper_left_y = self.upper_left[self.order, 1]
+        # how far a box's top edge can sit below its bottom edge (skewed
+        # quadrilaterals), so the bottom-edge bound stays exact
+        self.max_inversion = max(
+            float((self.upper_left[:, 1] - self.lower_right[:, 1]).max(initial=0)), 0.0
+        )
+
+    def query(self, upper_left_x, upper_left_y, lower_right_x, lower_right_y):
+        # rows strictly inside the rectangle, in page order
+        start = np.searchsorted(self.sorted_upper_left_y, upper_left_y, side="right")
+        stop = np.searchsorted(
+            self.sorted_upper_left_y, lower_right_y + self.max_inversion, side="left"
+        )
+        rows = self.order[start:stop]
+        inside = (
+            (self.upper_left[rows, 0] > upper_left_x)
+            & (self.upper_left[rows, 1] > upper_left_y)
+            & (self.lower_right[rows, 0] < lower_right_x)
+            & (self.lower_right[rows, 1] < lower_right_y)
+        )
+        return np.sort(rows[inside])
+
+
+def align_nearest_rows(row_y, column_y, tolerance=None):
+    # for every row y, the position in column_y of the nearest value, found
+    # with one sort and a binary search instead of a full argsort per row;
+    # -1 marks rows with no value within tolerance (or every row, for an
+    # empty column)
+    nearest = np.full(len(row_y), -1, dtype=np.intp)
+    if len(row_y) == 0 or len(column_y) == 0:
+        return nearest
+
+    order = np.argsort(column_y, kind="stable")
+    sorted_y = column_y[order]
+    right = np.searchsorted(sorted_y, row_y, side="left")
+    left = right - 1
+    right_clipped = np.minimum(right, len(sorted_y) - 1)
+    left_clipped = np.maximum(left, 0)
+
+    # among equal y values prefer the earliest row, as the per-row argsort did
+    left_first = np.searchsorted(sorted_y, sorted_y[left_clipped], side="left")
+    right_rows = order[right_clipped]
+    left_rows = order[left_first]
+    right_distance = np.where(
+        right < len(sorted_y), np.abs(sorted_y[right_clipped] - row_y), np.inf
+    )
+    left_distance = np.where(left >= 0, np.abs(sorted_y[left_clipped] - row_y), np.inf)
+
+    take_left = (left_distance < right_distance) | (
+        (left_distance == right_distance) & (left_rows < right_rows)
+    )
+    nearest = np.where(take_left, left_rows, right_rows)
+    if tolerance is not None:
+        nearest[np.minimum(left_distance, right_distance) > tolerance] = -1
+    return nearest
+
+
+def assign_line_ids(y, line_gap):
+    # a new line starts wherever the next box sits more than line_gap lower
+    line_ids = np.zeros(len(y), dtype=np.intp)
+    np.cumsum(np.diff(y) > line_gap, out=line_ids[1:])
+    return line_ids
+
+
+def join_text_by_line(y, texts, line_gap):
+    # boxes are taken in page order; returns one space-joined string per line
+    lines = []
+    for line_id, text in zip(assign_line_ids(y, line_gap), texts):
+        if line_id == len(lines):
+            lines.append([])
+        lines[line_id].append(text)
+    return [" ".join(line) for line in lines]
+
+
+def assign_table_columns(right_x, column_borders):
+    # column label per box: the index of the first border its right edge is
+    # left of, or len(column_borders) for the last column. The running max
+    # makes the borders sorted for np.digitize without changing which border
+    # a box hits first; a missing (NaN) border never matches, as before.
+    column_borders = np.asarray(column_borders, dtype=np.float64)
+    column_borders = np.maximum.accumulate(
+        np.where(np.isnan(column_borders), -np.inf, column_borders)
+    )
+    return np.digitize(right_x, column_borders)
+
+
+non_digit_pattern = re.compile(r"[^0-9]+")
+non_amount_pattern = re.compile(r"[^0-9\.]+")
+non_label_pattern = re.compile(r"[^A-Za-z0-9\.\s]+")
+non_letter_pattern = re.compile(r"[^A-Za-z]+")
+
+
+def parse_cents(digits):
+    # digits with two implied decimal places, e.g. "132000" -> Decimal("1320.00")
+    return Decimal(digits + "e-2")
+
+
+def parse_amount(amount_text):
+    if "." not in amount_text:
+        return parse_cents(amount_text)
+    try:
+        return Decimal(amount_text)
+    except InvalidOperation:
+        return None
+
+
+class NormalizedCells:
+    __slots__ = ("digits", "labels", "table_amounts", "payment_amounts")
+
+    def __init__(self, texts):
+        # every cell on the page is cleaned once with the precompiled patterns,
+        # and amounts are parsed straight to exact Decimals
+        self.digits = [non_digit_pattern.sub("", text) for text in texts]
+        self.labels = [non_label_pattern.sub("", text) for text in texts]
+        self.table_amounts = [
+            parse_cents(digits) if digits else None for digits in self.digits
+        ]
+        self.payment_amounts = [
+            parse_amount(amount_text) if amount_text else None
+            for amount_text in (non_amount_pattern.sub("", text) for text in texts)
+        ]
+
+
 class SingGenHospInvoice:
-    def __init__(self):
-        self.hospital_names = ["Singapore General Hospital", "Tan Tock Seng Hospital"]
+    def __init__(self, row_tolerance=None, debug_dir=None, page_index=None):
+        # the compiled layout template of the page's hospital, chosen once the
+        # hospital name is read; the first registered layout until then
+        self.layout = layout_registry.default_plan
         self.invoice_df = None
+        self.bbox_array = None
         self.hospital_name = None
         self.key_info = None
         self.invoice_table = None
         self.margin = 5
-        self.invoice_key_info_fields = [
-            "Tax Invoice Number",
-            "Bill Ref Number",
-            "Tax Invoice Date",
-            "Patient NRICI/HRN",
-            "Visit Date",
-            "Visit/Bill Location",
-            "Payment Class",
-            "Type of Supply",
-            "GST Reg No",
-            "Page No",
-            "Bill Type",
-        ]
+        # pixel thresholds (margin, line gap, row tolerance) are tuned for an A4
+        # page rendered at PaddleOCR's 2x zoom (144 DPI) and scaled by the actual
+        # rendered page height when it is known, so they hold at any DPI
+        self.reference_page_height = 1684
+        self.page_scale = 1.0
+        self.line_gap = 15
+        # max y distance for aligning a table cell to a row, at the reference
+        # page height; None always snaps to the nearest cell
+        self.row_tolerance = row_tolerance
+        self.unmatched_cells = []
+        # intermediate payment columns and the page's invoice.json are only
+        # written out when a debug directory is given, named after page_index
+        # when it is known so a document's pages don't overwrite each other
+        self.debug_dir = debug_dir
+        self.page_index = page_index
+        self.anchor_index = None
+        self.spatial_index = None
+        self.normalized_cells = None
         self.gst_to_page_info = None
         self.invoice_json = None
         self.total_payments_info = None
 
-    def make_invoice_df(self, page):
-        df = pd.DataFrame(page, columns=["bbox", "text"])
-        df["text"] = df["text"].apply(lambda x: x[0].strip())
-        df["bbox_upper_left_x"] = df["bbox"].apply(lambda x: x[0][0])
-        df["bbox_upper_left_y"] = df["bbox"].apply(lambda x: x[0][1])
-        df["bbox_upper_right_x"] = df["bbox"].apply(lambda x: x[1][0])
-        df["bbox_upper_right_y"] = df["bbox"].apply(lambda x: x[1][1])
-        df["bbox_lower_right_x"] = df["bbox"].apply(lambda x: x[2][0])
-        df["bbox_lower_right_y"] = df["bbox"].apply(lambda x: x[2][1])
-        df["bbox_lower_left_x"] = df["bbox"].apply(lambda x: x[3][0])
-        df["bbox_lower_left_y"] = df["bbox"].apply(lambda x: x[3][1])
+    def make_invoice_df(self, page, page_height=None):
+        if page_height is not None:
+            self.page_scale = page_height / self.reference_page_height
+        # all quadrilaterals in one N x 4 x 2 array (for pages from a columnar
+        # store, a view of it); the eight coordinate columns are built from a
+        # single N x 8 view of that
+        self.bbox_array, texts = get_page_columns(page)
+        texts = [text.strip() for text in texts]
+        df = pd.DataFrame(
+            self.bbox_array.reshape(-1, 8),
+            columns=[
+                "bbox_upper_left_x",
+                "bbox_upper_left_y",
+                "bbox_upper_right_x",
+                "bbox_upper_right_y",
+                "bbox_lower_right_x",
+                "bbox_lower_right_y",
+                "bbox_lower_left_x",
+                "bbox_lower_left_y",
+            ],
+            copy=False,
+        )
+        df.insert(0, "text", texts)
         self.invoice_df = df
+        self.anchor_index = None
+        self.spatial_index = SpatialIndex(self.bbox_array)
+        self.normalized_cells = None
+
+    def get_anchor_index(self):
+        # built on first use, for the page's layout only
+        if self.anchor_index is None:
+            self.anchor_index = AnchorIndex(self.get_column_values("text"), self.layout)
+        return self.anchor_index
+
+    def get_region_df(self, upper_left_x, upper_left_y, lower_right_x, lower_right_y):
+        return self.invoice_df.iloc[
+            self.spatial_index.query(
+                upper_left_x, upper_left_y, lower_right_x, lower_right_y
+            )
+        ]
+
+    def get_anchor_rows(self, anchor, region=None):
+        # region is a region as given by get_region, here a DataFrame
+        rows = self.get_anchor_index().get_rows(anchor)
+        if region is not None:
+            rows = rows[np.isin(rows, region.index)]
+        return rows
+
+    def get_anchor_value(self, anchor, column, region=None):
+        if region is None:
+            row = self.get_anchor_index().get_first_row(anchor)
+        else:
+            row = self.get_anchor_rows(anchor, region)[0]
+        return self.get_column_values(column)[row]
+
+    def get_column_values(self, column):
+        return self.invoice_df[column].values
+
+    def get_normalized_cells(self):
+        if self.normalized_cells is None:
+            self.normalized_cells = NormalizedCells(self.get_column_values("text"))
+        return self.normalized_cells
 
     def get_hospital_name_bbox(self):
+        # the hospital name spans from the first box on the page to the first
+        # box mentioning "hospital"
+        first_row = 0
+        hospital_row = layout_registry.find_hospital_row(self.get_column_values("text"))
+        upper_left_xs = self.get_column_values("bbox_upper_left_x")
+        upper_left_ys = self.get_column_values("bbox_upper_left_y")
+        lower_right_xs = self.get_column_values("bbox_lower_right_x")
+        lower_right_ys = self.get_column_values("bbox_lower_right_y")
+
         upper_left_x = (
             min(
-                self.invoice_df.iloc[0]["bbox_upper_left_x"],
-                self.invoice_df[
-                    self.invoice_df["text"].str.contains("hospital", case=False)
-                ].iloc[0]["bbox_upper_left_x"],
+                upper_left_xs[first_row],
+                upper_left_xs[hospital_row],
             )
-            - self.margin
+            - self.get_margin()
         )
 
         upper_left_y = (
             min(
-                self.invoice_df.iloc[0]["bbox_upper_left_y"],
-                self.invoice_df[
-                    self.invoice_df["text"].str.contains("hospital", case=False)
-                ].iloc[0]["bbox_lower_right_y"],
+                upper_left_ys[first_row],
+                lower_right_ys[hospital_row],
             )
-            - self.margin
+            - self.get_margin()
         )
 
         lower_right_x = (
             max(
-                self.invoice_df.iloc[0]["bbox_lower_right_x"],
-                self.invoice_df[
-                    self.invoice_df["text"].str.contains("hospital", case=False)
-                ].iloc[0]["bbox_lower_right_x"],
+                lower_right_xs[first_row],
+                lower_right_xs[hospital_row],
             )
-            + self.margin
+            + self.get_margin()
         )
         lower_right_y = (
             max(
-                self.invoice_df.iloc[0]["bbox_lower_right_y"],
-                self.invoice_df[
-                    self.invoice_df["text"].str.contains("hospital", case=False)
-                ].iloc[0]["bbox_lower_right_y"],
+                lower_right_ys[first_row],
+                lower_right_ys[hospital_row],
             )
-            + self.margin
+            + self.get_margin()
         )
         return upper_left_x, upper_left_y, lower_right_x, lower_right_y
 
@@ -126,41 +686,27 @@ class SingGenHospInvoice:
             lower_right_x,
             lower_right_y,
         ) = self.get_hospital_name_bbox()
+        texts = self.get_column_values("text")
         hospital_name = (
             " ".join(
-                self.invoice_df[
-                    (self.invoice_df["bbox_upper_left_x"] > upper_left_x)
-                    & (self.invoice_df["bbox_upper_left_y"] > upper_left_y)
-                    & (self.invoice_df["bbox_lower_right_x"] < lower_right_x)
-                    & (self.invoice_df["bbox_lower_right_y"] < lower_right_y)
-                ]["text"].to_list()
+                texts[row]
+                for row in self.spatial_index.query(
+                    upper_left_x, upper_left_y, lower_right_x, lower_right_y
+                )
             )
             .strip()
             .title()
         )
 
-        if hospital_name not in self.hospital_names:
-            raise ValueError("Hospital name not found")
-        else:
-            self.hospital_name = hospital_name
+        # raises ValueError("Hospital name not found") for unknown hospitals
+        layout = layout_registry.get_plan(hospital_name)
+        if layout is not self.layout:
+            self.layout = layout
+            self.anchor_index = None
+        self.hospital_name = hospital_name
 
     def get_gst_to_page_number_bbox(self):
-        upper_left_x = self.invoice_df["bbox_upper_left_x"].min() - self.margin
-        upper_left_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("TAX INVOICE")][
-                "bbox_lower_left_y"
-            ].values[0]
-            + self.margin
-        )
-        lower_right_x = self.invoice_df["bbox_lower_right_x"].max() + self.margin
-        lower_right_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("Tax Invoice Number")][
-                "bbox_upper_left_y"
-            ].values[0]
-            + self.margin
-        )
-
-        return upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        return self.layout.get_region_bbox("gst_to_page_number", self)
 
     def get_gst_to_page_number_df(self):
         (
@@ -169,43 +715,32 @@ class SingGenHospInvoice:
             lower_right_x,
             lower_right_y,
         ) = self.get_gst_to_page_number_bbox()
-        gst_to_page_number_df = self.invoice_df[
-            (self.invoice_df["bbox_upper_left_x"] > upper_left_x)
-            & (self.invoice_df["bbox_upper_left_y"] > upper_left_y)
-            & (self.invoice_df["bbox_lower_right_x"] < lower_right_x)
-            & (self.invoice_df["bbox_lower_right_y"] < lower_right_y)
-        ]
-        return gst_to_page_number_df.reset_index(drop=True)
+        gst_to_page_number_df = self.get_region_df(
+            upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        )
+        # rows keep their page index so anchor lookups can be reused
+        return gst_to_page_number_df
+
+    def get_gst_to_page_number_region(self):
+        # the region in the form this engine's anchor lookups take
+        return self.get_gst_to_page_number_df()
 
     def get_gst_to_page_number_info(self):
-        gst_to_page_number_df = self.get_gst_to_page_number_df()
+        gst_to_page_number_df = self.get_gst_to_page_number_region()
         gst_to_page_num_dict = {}
         gst_to_page_num_dict["gst_number"] = (
-            gst_to_page_number_df[
-                gst_to_page_number_df["text"].str.contains("GST REG NO")
-            ]["text"]
-            .values[0]
+            self.get_anchor_value("GST REG NO", "text", gst_to_page_number_df)
             .split(":")[-1]
             .strip()
         )
-        gst_to_page_num_dict["bill_type"] = gst_to_page_number_df[
-            gst_to_page_number_df["text"].str.contains("ORIGINAL|DUPLICATE|INTERIM")
-        ]["text"].values[0]
-        gst_to_page_num_dict["page_number"] = (
-            gst_to_page_number_df[gst_to_page_number_df["text"].str.contains("Page")][
-                "text"
-            ]
-            .values[0]
-            .split("/")[-1]
-            .replace("Page", "")
-            .strip()
+        gst_to_page_num_dict["bill_type"] = self.get_anchor_value(
+            "Bill Type", "text", gst_to_page_number_df
         )
-        tax_date = re.findall(
-            r"\d{2}[\.\s]+\d{2}[\.\s]+\d{4}",
-            gst_to_page_number_df[gst_to_page_number_df["text"].str.contains("Page")][
-                "text"
-            ].values[0],
+        page_text = self.get_anchor_value("Page", "text", gst_to_page_number_df)
+        gst_to_page_num_dict["page_number"] = (
+            page_text.split("/")[-1].replace("Page", "").strip()
         )
+        tax_date = re.findall(r"\d{2}[\.\s]+\d{2}[\.\s]+\d{4}", page_text)
         if len(tax_date) > 0:
             gst_to_page_num_dict["tax_invoice_date"] = tax_date[0]
         else:
@@ -213,43 +748,7 @@ class SingGenHospInvoice:
         self.gst_to_page_info = gst_to_page_num_dict
 
     def get_key_info_bbox(self):
-        upper_left_x = (
-            self.invoice_df[self.invoice_df["text"].str.contains("Tax Invoice Number")][
-                "bbox_upper_left_x"
-            ].values[0]
-            - self.margin
-        )
-        upper_left_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("Tax Invoice Number")][
-                "bbox_upper_left_y"
-            ].values[0]
-            - self.margin
-        )
-
-        # lower right x coordinate is the max of the x coordinates in the sub dataframe between 'Tax Invoice Number' and 'Type of Supply'
-
-        index_of_tax_invoice_number = self.invoice_df[
-            self.invoice_df["text"].str.contains("Tax Invoice Number")
-        ].index[0]
-        index_of_type_of_supply = self.invoice_df[
-            self.invoice_df["text"].str.contains("Type of Supply")
-        ].index[0]
-
-        lower_right_x = (
-            self.invoice_df.iloc[index_of_tax_invoice_number:index_of_type_of_supply][
-                "bbox_lower_right_x"
-            ].max()
-            + self.margin
-        )
-
-        lower_right_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("Type of Supply")][
-                "bbox_lower_right_y"
-            ].values[0]
-            + self.margin
-        )
-
-        return upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        return self.layout.get_region_bbox("key_info", self)
 
     def get_key_info_box_df(self):
         (
@@ -259,21 +758,25 @@ class SingGenHospInvoice:
             lower_right_y,
         ) = self.get_key_info_bbox()
 
-        df_key_info_box = self.invoice_df[
-            (self.invoice_df["bbox_upper_left_x"] > upper_left_x - self.margin)
-            & (self.invoice_df["bbox_upper_left_y"] > upper_left_y - self.margin)
-            & (self.invoice_df["bbox_lower_right_x"] < lower_right_x + self.margin)
-            & (self.invoice_df["bbox_lower_right_y"] < lower_right_y + self.margin)
-        ].copy()
+        df_key_info_box = self.get_region_df(
+            upper_left_x - self.get_margin(),
+            upper_left_y - self.get_margin(),
+            lower_right_x + self.get_margin(),
+            lower_right_y + self.get_margin(),
+        ).copy()
 
-        return df_key_info_box.reset_index(drop=True)
+        return df_key_info_box
 
-    def get_key_info(self):
+    def get_key_info_lines(self):
         df_key_info_box = self.get_key_info_box_df()
-        df_key_info_box = self.check_if_same_line_append_newline_character(
-            df_key_info_box
+        return join_text_by_line(
+            df_key_info_box["bbox_upper_left_y"].values,
+            df_key_info_box["text"].values,
+            self.get_line_gap(),
         )
-        key_info_box_text = " ".join(df_key_info_box["text_with_newline"].values)
+
+    def get_key_info(self):
+        key_info_box_text = "\n ".join(self.get_key_info_lines())
         key_info_box_text_corrected = self.replace_visit_location(key_info_box_text)
 
         key_info_box_dict = {}
@@ -294,33 +797,7 @@ class SingGenHospInvoice:
         }
 
     def get_invoice_table_bbox(self):
-        upper_left_x = (
-            self.invoice_df[self.invoice_df["text"].str.contains("SERVICE CODE")][
-                "bbox_upper_left_x"
-            ].values[0]
-            - self.margin
-        )
-        upper_left_y = (
-            min(
-                self.invoice_df[self.invoice_df["text"].str.contains("SERVICE CODE")][
-                    "bbox_upper_left_y"
-                ].values[0],
-                self.invoice_df[self.invoice_df["text"].str.contains("AMOUNT")][
-                    "bbox_upper_right_y"
-                ].values[0],
-            )
-            - self.margin
-        )
-
-        lower_right_x = self.invoice_df["bbox_upper_right_x"].max() + self.margin
-        lower_right_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("Subtotal Charges")][
-                "bbox_lower_right_y"
-            ].values[0]
-            + self.margin
-        )
-
-        return upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        return self.layout.get_region_bbox("invoice_table", self)
 
     def get_invoice_table_df(self):
         (
@@ -330,146 +807,90 @@ class SingGenHospInvoice:
             lower_right_y,
         ) = self.get_invoice_table_bbox()
 
-        df_invoice_table = self.invoice_df[
-            (self.invoice_df["bbox_upper_left_x"] > upper_left_x)
-            & (self.invoice_df["bbox_upper_left_y"] > upper_left_y)
-            & (self.invoice_df["bbox_lower_right_x"] < lower_right_x)
-            & (self.invoice_df["bbox_lower_right_y"] < lower_right_y)
-        ].copy()
+        df_invoice_table = self.get_region_df(
+            upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        ).copy()
 
-        return df_invoice_table.reset_index(drop=True)
+        # rows keep their page index so anchor lookups can be reused
+        return df_invoice_table
 
     def get_invoice_table_by_column(self, df_invoice_table):
-        (
-            description_border_left_x,
-            quantity_border_left_x,
-            amount_border_left_x,
-        ) = self.get_invoice_table_column_borders(df_invoice_table)
-
-        df_invoice_table_codes = df_invoice_table[
-            df_invoice_table["bbox_upper_right_x"] < description_border_left_x
-        ].copy()
-
-        df_invoice_table_minus_codes = df_invoice_table[
-            df_invoice_table.index.isin(df_invoice_table_codes.index) == False
-        ].copy()
-
-        df_invoice_table_description = df_invoice_table_minus_codes[
-            (
-                df_invoice_table_minus_codes["bbox_upper_right_x"]
-                < quantity_border_left_x
-            )
-        ].copy()
-
-        df_invoice_table_minus_codes_and_description = df_invoice_table_minus_codes[
-            df_invoice_table_minus_codes.index.isin(df_invoice_table_description.index)
-            == False
-        ].copy()
-
-        df_invoice_table_quantity = df_invoice_table_minus_codes_and_description[
-            (
-                df_invoice_table_minus_codes_and_description["bbox_upper_right_x"]
-                < amount_border_left_x
-            )
-        ].copy()
-
-        df_invoice_table_amount = df_invoice_table_minus_codes_and_description[
-            df_invoice_table_minus_codes_and_description.index.isin(
-                df_invoice_table_quantity.index
-            )
-            == False
-        ].copy()
+        column_borders = self.get_invoice_table_column_borders(df_invoice_table)
+        column_labels = assign_table_columns(
+            df_invoice_table["bbox_upper_right_x"].values, column_borders
+        )
 
         return self.clean_invoice_table_columns(
-            (
-                df_invoice_table_codes,
-                df_invoice_table_description,
-                df_invoice_table_quantity,
-                df_invoice_table_amount,
+            tuple(
+                df_invoice_table[column_labels == column_label]
+                for column_label in range(len(column_borders) + 1)
             )
         )
 
     def align_invoice_table_columns(self):
-        (
-            df_invoice_table_codes,
-            df_invoice_table_description,
-            df_invoice_table_quantity,
-            df_invoice_table_amount,
-        ) = self.get_invoice_table_by_column(self.get_invoice_table_df())
-
-        line_items = []
-        for i, row in df_invoice_table_codes.iterrows():
-            line_items.append(
-                {
-                    "item_code": row["text"],
-                    "item_description": df_invoice_table_description.iloc[
-                        (
-                            df_invoice_table_description["bbox_upper_left_y"]
-                            - row["bbox_upper_left_y"]
-                        )
-                        .abs()
-                        .argsort()[:1]
-                    ]["text"].values[0],
-                    "item_quantity": df_invoice_table_quantity.iloc[
-                        (
-                            df_invoice_table_quantity["bbox_upper_left_y"]
-                            - row["bbox_upper_left_y"]
-                        )
-                        .abs()
-                        .argsort()[:1]
-                    ]["text"].values[0],
-                    "item_amount": df_invoice_table_amount.iloc[
-                        (
-                            df_invoice_table_amount["bbox_upper_left_y"]
-                            - row["bbox_upper_left_y"]
-                        )
-                        .abs()
-                        .argsort()[:1]
-                    ]["text"].values[0],
-                }
+        table_columns = self.get_invoice_table_by_column(self.get_invoice_table_df())
+        self.check_table_columns([len(df_column) for df_column in table_columns])
+
+        # the first column's cells are the rows, the other columns are aligned
+        # to them
+        row_y = table_columns[0]["bbox_upper_left_y"].values
+        item_columns = [table_columns[0]["text"].values] + [
+            self.align_column_to_rows(row_y, df_column, "Table", column["name"])
+            for column, df_column in zip(
+                self.layout.table_columns[1:], table_columns[1:]
             )
+        ]
+        self.invoice_table = self.make_invoice_table(item_columns)
+
+    def check_table_columns(self, column_sizes):
+        # every column has cells, or none has (a table without line items);
+        # an empty column among full ones means the column borders were not
+        # found and cells landed in a neighbouring column
+        if any(column_sizes) and not all(column_sizes):
+            empty_columns = [
+                column["name"]
+                for column, size in zip(self.layout.table_columns, column_sizes)
+                if not size
+            ]
+            raise ValueError(f"no cells in the Table columns {empty_columns}")
+
+    def make_invoice_table(self, item_columns):
+        column_names = [column["name"] for column in self.layout.table_columns]
+        return [dict(zip(column_names, item)) for item in zip(*item_columns)]
+
+    def align_column_to_rows(self, row_y, df_column, section, column):
+        return self.align_texts_to_rows(
+            row_y,
+            df_column["bbox_upper_left_y"].values,
+            df_column["text"].values,
+            section,
+            column,
+        )
 
-        self.invoice_table = line_items
+    def align_texts_to_rows(self, row_y, column_y, texts, section, column):
+        # rows with nothing at all to align to fail the page, as with an empty
+        # table column, instead of giving a page of None
+        if len(row_y) and not len(column_y):
+            raise ValueError(f"no cells in the {section} column {column}")
+        nearest = align_nearest_rows(row_y, column_y, self.get_row_tolerance())
+        aligned = []
+        for row, position in enumerate(nearest):
+            if position < 0:
+                # reported rather than snapped to whatever cell is closest
+                self.unmatched_cells.append(
+                    {"section": section, "row": row, "column": column}
+                )
+                aligned.append(None)
+            else:
+                aligned.append(texts[position])
+        return aligned
 
     def get_invoice_table_column_borders(self, df_invoice_table):
-        description_border_left_x = (
-            df_invoice_table[df_invoice_table["text"].str.contains("DESCRIPTION")][
-                "bbox_upper_left_x"
-            ].min()
-            - self.margin
-        )
-        quantity_border_left_x = (
-            df_invoice_table[df_invoice_table["text"].str.contains("QUANTITY")][
-                "bbox_upper_left_x"
-            ].min()
-            - self.margin
-        )
-        amount_border_left_x = (
-            df_invoice_table[df_invoice_table["text"].str.contains("Subtotal")][
-                "bbox_upper_right_x"
-            ].max()
-            + self.margin
-        )
-
-        return description_border_left_x, quantity_border_left_x, amount_border_left_x
+        # the borders between the layout's table columns, within the table
+        return self.layout.get_column_borders(self, df_invoice_table)
 
     def get_payment_info_bbox(self):
-        upper_left_x = self.invoice_df["bbox_upper_left_x"].min() - self.margin
-        upper_left_y = (
-            self.invoice_df[
-                self.invoice_df["text"].str.contains(r"Total[A-z\s]*le", regex=True)
-            ]["bbox_lower_left_y"].values[0]
-            - self.margin
-        )
-        lower_right_x = self.invoice_df["bbox_lower_right_x"].max() + self.margin
-        lower_right_y = (
-            self.invoice_df[self.invoice_df["text"].str.contains("NET AMOUNT PAYABLE")][
-                "bbox_lower_right_y"
-            ].max()
-            + self.margin
-        )
-
-        return upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        return self.layout.get_region_bbox("payment_info", self)
 
     def get_payment_info_df(self):
         (
@@ -478,42 +899,39 @@ class SingGenHospInvoice:
             lower_right_x,
             lower_right_y,
         ) = self.get_payment_info_bbox()
-        payment_info_df = self.invoice_df[
-            (self.invoice_df["bbox_upper_left_x"] > upper_left_x)
-            & (self.invoice_df["bbox_upper_left_y"] > upper_left_y)
-            & (self.invoice_df["bbox_lower_right_x"] < lower_right_x)
-            & (self.invoice_df["bbox_lower_right_y"] < lower_right_y)
-        ].copy()
+        payment_info_df = self.get_region_df(
+            upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        ).copy()
         return payment_info_df
 
     def get_payment_info(self):
         payment_info_df = self.get_payment_info_df()
-        payment_info_df["text"] = payment_info_df["text"].apply(
-            lambda x: re.sub(r"[^A-Za-z0-9\.\s]", "", x)
+        normalized_cells = self.get_normalized_cells()
+        payment_info_df = payment_info_df.assign(
+            text=[normalized_cells.labels[row] for row in payment_info_df.index],
+            amount=[
+                normalized_cells.payment_amounts[row] for row in payment_info_df.index
+            ],
         )
+        if payment_info_df.empty:
+            # no payment lines found: no totals, rather than an error
+            return (payment_info_df, payment_info_df)
 
         amount_payable_after_tax_right_x = (
             payment_info_df[
                 payment_info_df["text"].str.contains("AMOUNT PAYABLE AFTER TAX")
             ]["bbox_upper_right_x"].values[0]
-            + self.margin
+            + self.get_margin()
         )
-        payment_info_text_df = payment_info_df[
+        is_text = (
             payment_info_df["bbox_upper_left_x"] < amount_payable_after_tax_right_x
-        ].copy()
-        payment_info_payment_df = payment_info_df[
-            payment_info_df.index.isin(payment_info_text_df.index) == False
-        ].copy()
-
-        payment_info_payment_df["text"] = payment_info_payment_df["text"].apply(
-            lambda x: re.sub(r"[^0-9\.]", "", x)
         )
-        payment_info_payment_df = payment_info_payment_df[
-            payment_info_payment_df["text"] != ""
-        ].copy()
-
-        payment_info_payment_df["text"] = payment_info_payment_df["text"].apply(
-            lambda x: self.add_decimal_point(x)
+        payment_info_text_df = payment_info_df[is_text]
+        payment_info_payment_df = payment_info_df[
+            ~is_text & payment_info_df["amount"].notna()
+        ]
+        payment_info_payment_df = payment_info_payment_df.assign(
+            text=payment_info_payment_df["amount"].astype(str)
         )
 
         return (payment_info_text_df, payment_info_payment_df)
@@ -521,42 +939,36 @@ class SingGenHospInvoice:
     def align_payment_info_table_columns(self):
         payment_info_text_df, payment_info_payment_df = self.get_payment_info()
 
-        payment_info_payment_df["text"].to_csv(
-            "payment_info_payment_df.csv", index=False
-        )
-        payment_info_text_df["text"].to_csv("payment_info_text_df.csv", index=False)
-
-        line_items = []
-        for i, row in payment_info_text_df.iterrows():
-            line_items.append(
-                {
-                    "payment_info": row["text"],
-                    "payment_amount": payment_info_payment_df.iloc[
-                        (
-                            payment_info_payment_df["bbox_upper_left_y"]
-                            - row["bbox_upper_left_y"]
-                        )
-                        .abs()
-                        .argsort()[:1]
-                    ]["text"].values[0],
-                }
+        self.save_debug_column(
+            "payment_info_payment_df.csv", payment_info_payment_df["text"]
+        )
+        self.save_debug_column("payment_info_text_df.csv", payment_info_text_df["text"])
+
+        payment_amounts = self.align_texts_to_rows(
+            payment_info_text_df["bbox_upper_left_y"].values,
+            payment_info_payment_df["bbox_upper_left_y"].values,
+            payment_info_payment_df["amount"].values,
+            "TotalPayments",
+            "payment_amount",
+        )
+        line_items = [
+            {"payment_info": payment_info, "payment_amount": payment_amount}
+            for payment_info, payment_amount in zip(
+                payment_info_text_df["text"].values, payment_amounts
             )
+        ]
         self.total_payments_info = self.get_total_payments_dict(line_items)
 
-    def check_if_same_line_append_newline_character(self, df):
-        df["text_with_newline"] = ""
-        for idx in range(df.shape[0] - 1):
-            if (
-                df.iloc[idx + 1]["bbox_upper_left_y"]
-                - df.iloc[idx]["bbox_upper_left_y"]
-                > 15
-            ):
-                df.loc[idx, "text_with_newline"] = df.iloc[idx]["text"] + "\n"
-            else:
-                df.loc[idx, "text_with_newline"] = df.iloc[idx]["text"]
-        # copy the last row
-        df.loc[df.shape[0] - 1, "text_with_newline"] = df.iloc[df.shape[0] - 1]["text"]
-        return df
+    def get_margin(self):
+        return self.margin * self.page_scale
+
+    def get_line_gap(self):
+        return self.line_gap * self.page_scale
+
+    def get_row_tolerance(self):
+        if self.row_tolerance is None:
+            return None
+        return self.row_tolerance * self.page_scale
 
     def replace_visit_location(self, text):
         pattern = r"\bVisit\/([\s\S]*)Payment"
@@ -569,57 +981,36 @@ class SingGenHospInvoice:
             return text
 
     def check_if_line_starts_with_field_name(self, text):
-        for field in self.invoice_key_info_fields:
+        for field in self.layout.key_info_fields:
             if text.startswith(field):
                 return field
         return None
 
-    def add_decimal_point(self, text):
-        if text.find(".") == -1:
-            return text[:-2] + "." + text[-2:]
-        else:
-            return text
-
     def clean_invoice_table_columns(self, invoice_table_columns):
-        (
-            df_invoice_table_codes,
-            df_invoice_table_description,
-            df_invoice_table_quantity,
-            df_invoice_table_amount,
-        ) = invoice_table_columns
-        df_invoice_table_codes = df_invoice_table_codes[
-            df_invoice_table_codes["text"].str.contains("SERVICE CODE") == False
-        ].reset_index(drop=True)
-
-        df_invoice_table_description = df_invoice_table_description[
-            df_invoice_table_description["text"].str.contains("DESCRIPTION") == False
-        ].reset_index(drop=True)
-
-        # remove where text is not a number in quantity and amount
-        df_invoice_table_quantity["text"] = df_invoice_table_quantity["text"].apply(
-            lambda x: re.sub(r"[^0-9]", "", x)
-        )
-        df_invoice_table_quantity = df_invoice_table_quantity[
-            df_invoice_table_quantity["text"].str.isnumeric()
-        ].copy()
-
-        df_invoice_table_amount["text"] = df_invoice_table_amount["text"].apply(
-            lambda x: re.sub(r"[^0-9]", "", x)
-        )
-        df_invoice_table_amount = df_invoice_table_amount[
-            df_invoice_table_amount["text"] != ""
-        ].copy()
-
-        df_invoice_table_amount["text"] = df_invoice_table_amount["text"].apply(
-            lambda x: self.add_decimal_point(x)
-        )
-
-        return (
-            df_invoice_table_codes.reset_index(drop=True),
-            df_invoice_table_description.reset_index(drop=True),
-            df_invoice_table_quantity.reset_index(drop=True),
-            df_invoice_table_amount.reset_index(drop=True),
-        )
+        # drops each column's header, and the cells of digits and amount
+        # columns that are not a number
+        normalized_cells = self.get_normalized_cells()
+        cleaned_columns = []
+        for column, df_column in zip(self.layout.table_columns, invoice_table_columns):
+            if column["header"] is not None:
+                df_column = df_column[
+                    ~df_column.index.isin(self.get_anchor_rows(column["header"]))
+                ]
+            if column["cells"] == "digits":
+                df_column = df_column.assign(
+                    text=[normalized_cells.digits[row] for row in df_column.index]
+                )
+                df_column = df_column[df_column["text"] != ""]
+            elif column["cells"] == "amount":
+                df_column = df_column.assign(
+                    amount=[
+                        normalized_cells.table_amounts[row] for row in df_column.index
+                    ]
+                )
+                df_column = df_column[df_column["amount"].notna()]
+                df_column = df_column.assign(text=df_column["amount"].astype(str))
+            cleaned_columns.append(df_column.reset_index(drop=True))
+        return tuple(cleaned_columns)
 
     def make_invoice_json(self):
         self.key_info["TaxInvoiceDate"] = self.gst_to_page_info["tax_invoice_date"]
@@ -633,40 +1024,352 @@ class SingGenHospInvoice:
             "TotalPayments": self.total_payments_info,
             "Key_Values": self.key_info,
         }
-        with open("invoice.json", "w") as f:
-            json.dump(invoice_json, f, indent=4)
+        if self.unmatched_cells:
+            # cells left as None because nothing lay within row_tolerance
+            invoice_json["Unmatched_Cells"] = self.unmatched_cells
+        if self.debug_dir is not None:
+            with open(self.get_debug_path("invoice.json"), "w") as f:
+                json.dump(invoice_json, f, indent=4)
         return invoice_json
 
+    def get_debug_path(self, file_name):
+        # e.g. invoice_page3.json for page_index 3
+        os.makedirs(self.debug_dir, exist_ok=True)
+        if self.page_index is not None:
+            name, extension = os.path.splitext(file_name)
+            file_name = f"{name}_page{self.page_index}{extension}"
+        return os.path.join(self.debug_dir, file_name)
+
+    def save_debug_column(self, file_name, texts):
+        if self.debug_dir is None:
+            return
+        with open(self.get_debug_path(file_name), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["text"])
+            writer.writerows([text] for text in texts)
+
     def get_total_payments_dict(self, total_payments_lines):
         total_payments_dict = {}
 
         for item in total_payments_lines:
-            payment_info = re.sub(r"[^A-Za-z]", "", item["payment_info"].title())
-            payment_amount = float(item["payment_amount"])
+            payment_info = non_letter_pattern.sub("", item["payment_info"].title())
+            if item["payment_amount"] is None:
+                payment_amount = None
+            else:
+                # the exact Decimal as a string, as the Table's amounts are
+                payment_amount = str(item["payment_amount"])
             total_payments_dict[payment_info] = payment_amount
 
         return total_payments_dict
 
 
+class BoxStore:
+    __slots__ = (
+        "bbox_array",
+        "bbox_upper_left_x",
+        "bbox_upper_left_y",
+        "bbox_upper_right_x",
+        "bbox_upper_right_y",
+        "bbox_lower_right_x",
+        "bbox_lower_right_y",
+        "bbox_lower_left_x",
+        "bbox_lower_left_y",
+        "text",
+    )
+
+    def __init__(self, page):
+        self.bbox_array, texts = get_page_columns(page)
+        # parallel per-box coordinate arrays, all views of bbox_array
+        self.bbox_upper_left_x = self.bbox_array[:, 0, 0]
+        self.bbox_upper_left_y = self.bbox_array[:, 0, 1]
+        self.bbox_upper_right_x = self.bbox_array[:, 1, 0]
+        self.bbox_upper_right_y = self.bbox_array[:, 1, 1]
+        self.bbox_lower_right_x = self.bbox_array[:, 2, 0]
+        self.bbox_lower_right_y = self.bbox_array[:, 2, 1]
+        self.bbox_lower_left_x = self.bbox_array[:, 3, 0]
+        self.bbox_lower_left_y = self.bbox_array[:, 3, 1]
+        self.text = [text.strip() for text in texts]
+
+    def __len__(self):
+        return len(self.text)
+
+
+class LeanSingGenHospInvoice(SingGenHospInvoice):
+    # same extraction steps and output as SingGenHospInvoice, but boxes live in
+    # a BoxStore and every region or column is an array of row positions, so no
+    # DataFrame is built or copied; worthwhile on small pages where pandas
+    # overhead dominates
+
+    def __init__(self, row_tolerance=None, debug_dir=None, page_index=None):
+        super().__init__(
+            row_tolerance=row_tolerance, debug_dir=debug_dir, page_index=page_index
+        )
+        self.boxes = None
+
+    def make_invoice_df(self, page, page_height=None):
+        if page_height is not None:
+            self.page_scale = page_height / self.reference_page_height
+        self.boxes = BoxStore(page)
+        self.bbox_array = self.boxes.bbox_array
+        self.anchor_index = None
+        self.spatial_index = SpatialIndex(self.bbox_array)
+        self.normalized_cells = None
+
+    def get_column_values(self, column):
+        return getattr(self.boxes, column)
+
+    def get_region_rows(self, upper_left_x, upper_left_y, lower_right_x, lower_right_y):
+        return self.spatial_index.query(
+            upper_left_x, upper_left_y, lower_right_x, lower_right_y
+        )
+
+    def get_anchor_rows(self, anchor, region=None):
+        # region is a region as given by get_region_rows, an array of rows
+        rows = self.get_anchor_index().get_rows(anchor)
+        if region is not None:
+            rows = rows[np.isin(rows, region)]
+        return rows
+
+    def get_texts(self, rows):
+        return [self.boxes.text[row] for row in rows]
+
+    def get_gst_to_page_number_rows(self):
+        return self.get_region_rows(*self.get_gst_to_page_number_bbox())
+
+    def get_gst_to_page_number_region(self):
+        return self.get_gst_to_page_number_rows()
+
+    def get_key_info_box_rows(self):
+        (
+            upper_left_x,
+            upper_left_y,
+            lower_right_x,
+            lower_right_y,
+        ) = self.get_key_info_bbox()
+        return self.get_region_rows(
+            upper_left_x - self.get_margin(),
+            upper_left_y - self.get_margin(),
+            lower_right_x + self.get_margin(),
+            lower_right_y + self.get_margin(),
+        )
+
+    def get_key_info_lines(self):
+        rows = self.get_key_info_box_rows()
+        return join_text_by_line(
+            self.boxes.bbox_upper_left_y[rows],
+            self.get_texts(rows),
+            self.get_line_gap(),
+        )
+
+    def get_invoice_table_rows(self):
+        return self.get_region_rows(*self.get_invoice_table_bbox())
+
+    def get_payment_info_rows(self):
+        return self.get_region_rows(*self.get_payment_info_bbox())
+
+    def get_invoice_table_by_column(self, table_rows):
+        column_borders = self.get_invoice_table_column_borders(table_rows)
+        column_labels = assign_table_columns(
+            self.boxes.bbox_upper_right_x[table_rows], column_borders
+        )
+
+        return self.clean_invoice_table_columns(
+            tuple(
+                table_rows[column_labels == column_label]
+                for column_label in range(len(column_borders) + 1)
+            )
+        )
+
+    def clean_invoice_table_columns(self, invoice_table_columns):
+        # (rows, texts) per column
+        normalized_cells = self.get_normalized_cells()
+        cleaned_columns = []
+        for column, rows in zip(self.layout.table_columns, invoice_table_columns):
+            if column["header"] is not None:
+                rows = rows[~np.isin(rows, self.get_anchor_rows(column["header"]))]
+            if column["cells"] == "digits":
+                rows = np.array(
+                    [row for row in rows if normalized_cells.digits[row]],
+                    dtype=np.intp,
+                )
+                texts = [normalized_cells.digits[row] for row in rows]
+            elif column["cells"] == "amount":
+                rows = np.array(
+                    [
+                        row
+                        for row in rows
+                        if normalized_cells.table_amounts[row] is not None
+                    ],
+                    dtype=np.intp,
+                )
+                texts = [str(normalized_cells.table_amounts[row]) for row in rows]
+            else:
+                texts = self.get_texts(rows)
+            cleaned_columns.append((rows, texts))
+        return tuple(cleaned_columns)
+
+    def align_invoice_table_columns(self):
+        table_columns = self.get_invoice_table_by_column(self.get_invoice_table_rows())
+        self.check_table_columns([len(rows) for rows, _ in table_columns])
+
+        upper_left_y = self.boxes.bbox_upper_left_y
+        row_rows, row_texts = table_columns[0]
+        row_y = upper_left_y[row_rows]
+        item_columns = [row_texts] + [
+            self.align_texts_to_rows(
+                row_y, upper_left_y[rows], texts, "Table", column["name"]
+            )
+            for column, (rows, texts) in zip(
+                self.layout.table_columns[1:], table_columns[1:]
+            )
+        ]
+        self.invoice_table = self.make_invoice_table(item_columns)
+
+    def get_payment_info(self):
+        payment_info_rows = self.get_payment_info_rows()
+        normalized_cells = self.get_normalized_cells()
+        texts = [normalized_cells.labels[row] for row in payment_info_rows]
+        if not len(payment_info_rows):
+            return ((payment_info_rows, []), (payment_info_rows, []))
+
+        amount_payable_after_tax_position = [
+            i for i, x in enumerate(texts) if "AMOUNT PAYABLE AFTER TAX" in x
+        ][0]
+        amount_payable_after_tax_right_x = (
+            self.boxes.bbox_upper_right_x[
+                payment_info_rows[amount_payable_after_tax_position]
+            ]
+            + self.get_margin()
+        )
+        is_text = (
+            self.boxes.bbox_upper_left_x[payment_info_rows]
+            < amount_payable_after_tax_right_x
+        )
+        payment_info_text_rows = payment_info_rows[is_text]
+        payment_info_texts = [x for x, keep in zip(texts, is_text) if keep]
+
+        payment_info_payment_rows = np.array(
+            [
+                row
+                for row, keep in zip(payment_info_rows, is_text)
+                if not keep and normalized_cells.payment_amounts[row] is not None
+            ],
+            dtype=np.intp,
+        )
+        payment_info_payments = [
+            normalized_cells.payment_amounts[row] for row in payment_info_payment_rows
+        ]
+
+        return (
+            (payment_info_text_rows, payment_info_texts),
+            (payment_info_payment_rows, payment_info_payments),
+        )
+
+    def align_payment_info_table_columns(self):
+        (
+            (payment_info_text_rows, payment_info_texts),
+            (payment_info_payment_rows, payment_info_payments),
+        ) = self.get_payment_info()
+
+        self.save_debug_column(
+            "payment_info_payment_df.csv",
+            [str(amount) for amount in payment_info_payments],
+        )
+        self.save_debug_column("payment_info_text_df.csv", payment_info_texts)
+
+        upper_left_y = self.boxes.bbox_upper_left_y
+        payment_amounts = self.align_texts_to_rows(
+            upper_left_y[payment_info_text_rows],
+            upper_left_y[payment_info_payment_rows],
+            payment_info_payments,
+            "TotalPayments",
+            "payment_amount",
+        )
+        line_items = [
+            {"payment_info": payment_info, "payment_amount": payment_amount}
+            for payment_info, payment_amount in zip(payment_info_texts, payment_amounts)
+        ]
+        self.total_payments_info = self.get_total_payments_dict(line_items)
+
+
+invoice_parsers = {"pandas": SingGenHospInvoice, "lean": LeanSingGenHospInvoice}
+
+
+# extraction steps run in this order on every page, each one timed as its own
+# stage when profiling is on
+parse_steps = [
+    "get_hospital_name",
+    "get_gst_to_page_number_info",
+    "get_key_info",
+    "align_invoice_table_columns",
+    "align_payment_info_table_columns",
+]
+
+
+def parse_invoice_page(
+    page,
+    parser="pandas",
+    page_height=None,
+    debug_dir=None,
+    row_tolerance=None,
+    page_index=None,
+):
+    profiler = get_profiler()
+    invoice = invoice_parsers[parser](
+        row_tolerance=row_tolerance, debug_dir=debug_dir, page_index=page_index
+    )
+    with profiler.stage("make_invoice_df"):
+        invoice.make_invoice_df(page, page_height=page_height)
+    for step in parse_steps:
+        with profiler.stage(step):
+            getattr(invoice, step)()
+    with profiler.stage("make_invoice_json"):
+        return invoice.make_invoice_json()
+
+
+def stream_invoices(
+    pdf_to_ocr,
+    jsonl_path=None,
+    parser="pandas",
+    sink=None,
+    row_tolerance=None,
+    debug_dir=None,
+):
+    # renders, OCRs and parses one page at a time and yields each page's
+    # invoice as soon as it is ready. Each invoice is also written to sink, if
+    # given (the caller closes it, and the document is ended once its last
+    # page is written), and appended to a JSON Lines file at jsonl_path
+    jsonl_sink = JSONLinesSink(jsonl_path, include_source=False) if jsonl_path else None
+    try:
+        for page_index, page in enumerate(pdf_to_ocr.iter_pages()):
+            with get_profiler().stage("parse", page_index):
+                invoice_json = parse_invoice_page(
+                    page,
+                    parser=parser,
+                    page_height=pdf_to_ocr.get_page_height(page_index),
+                    row_tolerance=row_tolerance,
+                    debug_dir=debug_dir,
+                    page_index=page_index,
+                )
+            if sink is not None:
+                sink.write(invoice_json, pdf_to_ocr.pdf_path, page_index)
+            if jsonl_sink is not None:
+                jsonl_sink.write(invoice_json)
+            yield invoice_json
+        if sink is not None:
+            sink.end_document(pdf_to_ocr.pdf_path)
+    finally:
+        if jsonl_sink is not None:
+            jsonl_sink.close()
+
+
 if __name__ == "__main__":
     pdf_path = "Sample_For_Assignment.pdf"
     pdf_to_ocr = PDFToOCR(pdf_path, page_num=2)
-    pdf_to_ocr.perform_ocr()
-
-    full_json_list = []
-    for page in pdf_to_ocr.ocr_results[:2]:
-        invoice = SingGenHospInvoice()
-        invoice.make_invoice_df(page)
-        invoice.get_hospital_name()
-        invoice.get_gst_to_page_number_info()
-        invoice.get_key_info()
-        invoice.align_invoice_table_columns()
-        invoice.align_payment_info_table_columns()
-        invoice_json = invoice.make_invoice_json()
-
-        full_json_list.append(invoice_json)
-
-    with open("json_for_the_pdf.json", "w+") as f:
-        json_data = json.dumps(full_json_list, indent=2)
-        print(json_data)
-        json.dump(json_data, f)
+
+    full_json_list = list(stream_invoices(pdf_to_ocr))
+
+    json_data = encode_json(full_json_list, indent=True)
+    print(json_data.decode("utf-8"))
+    with open("json_for_the_pdf.json", "wb") as f:
+        f.write(json_data)
@@ -0,0 +1,181 @@
+import contextlib
+import cProfile
+import csv
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+class NullProfiler:
+    # the default hook: every stage is the same do-nothing context manager, so
+    # instrumented code costs one call per stage when profiling is off
+    enabled = False
+    null_stage = contextlib.nullcontext()
+
+    def stage(self, name, page=None):
+        return self.null_stage
+
+    def close(self):
+        pass
+
+
+class StageProfiler:
+    # records wall time, CPU time and (with track_memory) peak Python memory
+    # of every stage of every page. Stages nest: a stage entered inside
+    # another one inherits its page and its time is included in the outer
+    # stage. Stages named in profile_stages are also run under cProfile and
+    # dumped to profile_dir, one .prof file per stage and page
+    enabled = True
+    fields = ["stage", "page", "wall_time", "cpu_time", "peak_memory"]
+
+    def __init__(self, track_memory=False, profile_stages=(), profile_dir="profiles"):
+        self.track_memory = track_memory
+        self.profile_stages = set(profile_stages)
+        self.profile_dir = profile_dir
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_tracemalloc = track_memory and not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+
+    def close(self):
+        # memory tracing slows every allocation, so stop it with the profiler
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+            self.track_memory = False
+
+    @contextlib.contextmanager
+    def stage(self, name, page=None):
+        outer_page = getattr(self.local, "page", None)
+        if page is None:
+            page = outer_page
+        self.local.page = page
+
+        memory_stack = getattr(self.local, "memory_stack", None)
+        if memory_stack is None:
+            memory_stack = self.local.memory_stack = []
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the outer stage's peak so far would be lost by the reset
+            if memory_stack:
+                memory_stack[-1][1] = max(memory_stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            memory_stack.append([current, current])
+
+        profile = None
+        if name in self.profile_stages:
+            profile = cProfile.Profile()
+            profile.enable()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_wall
+            cpu_time = time.process_time() - start_cpu
+            if profile is not None:
+                profile.disable()
+                self.dump_profile(profile, name, page)
+
+            peak_memory = None
+            if self.track_memory:
+                start_memory, peak = memory_stack.pop()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                peak_memory = peak - start_memory
+                if memory_stack:
+                    memory_stack[-1][1] = max(memory_stack[-1][1], peak)
+            self.local.page = outer_page
+
+            with self.lock:
+                self.records.append(
+                    {
+                        "stage": name,
+                        "page": page,
+                        "wall_time": wall_time,
+                        "cpu_time": cpu_time,
+                        "peak_memory": peak_memory,
+                    }
+                )
+
+    def dump_profile(self, profile, name, page):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profile_name = name if page is None else f"{name}-page{page}"
+        profile.dump_stats(os.path.join(self.profile_dir, profile_name + ".prof"))
+
+    def add_records(self, records):
+        # records gathered by another profiler, e.g. in a worker process
+        with self.lock:
+            self.records.extend(records)
+
+    def take_records(self):
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+    def get_summary(self):
+        summary = {}
+        with self.lock:
+            records = list(self.records)
+        for record in records:
+            stage = summary.setdefault(
+                record["stage"],
+                {"count": 0, "wall_time": 0.0, "cpu_time": 0.0, "peak_memory": None},
+            )
+            stage["count"] += 1
+            stage["wall_time"] += record["wall_time"]
+            stage["cpu_time"] += record["cpu_time"]
+            if record["peak_memory"] is not None:
+                stage["peak_memory"] = max(
+                    stage["peak_memory"] or 0, record["peak_memory"]
+                )
+        for stage in summary.values():
+            stage["mean_wall_time"] = stage["wall_time"] / stage["count"]
+        return summary
+
+    def get_report(self):
+        with self.lock:
+            records = list(self.records)
+        return {"stages": self.get_summary(), "records": records}
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def save_csv(self, path):
+        with self.lock:
+            records = list(self.records)
+        # extra keys, like the pdf_path batch.py adds, become extra columns
+        extra_fields = {key for record in records for key in record}
+        fieldnames = self.fields + sorted(extra_fields - set(self.fields))
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(records)
+
+    def save_report(self, path):
+        if path.endswith(".csv"):
+            self.save_csv(path)
+        else:
+            self.save_json(path)
+
+
+null_profiler = NullProfiler()
+active_profiler = null_profiler
+
+
+def get_profiler():
+    return active_profiler
+
+
+def set_profiler(profiler):
+    # installs profiler as the pipeline-wide metrics hook, closing the one it
+    # replaces; None turns profiling off again
+    global active_profiler
+    if active_profiler is not profiler:
+        active_profiler.close()
+    active_profiler = profiler or null_profiler
+    return active_profiler
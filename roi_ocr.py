@@ -0,0 +1,251 @@
+import contextlib
+import re
+
+import numpy as np
+
+from layouts import layout_registry
+from profiling import get_profiler
+
+
+def sort_box_order(boxes):
+    # indexes of boxes in the reading order PaddleOCR gives its results: top
+    # to bottom, then left to right for boxes within 10 px of each other
+    # vertically
+    order = sorted(range(len(boxes)), key=lambda i: (boxes[i][0][1], boxes[i][0][0]))
+    for i in range(len(order) - 1):
+        for j in range(i, -1, -1):
+            upper, lower = boxes[order[j]][0], boxes[order[j + 1]][0]
+            if abs(lower[1] - upper[1]) < 10 and lower[0] < upper[0]:
+                order[j], order[j + 1] = order[j + 1], order[j]
+            else:
+                break
+    return order
+
+
+def sort_boxes(boxes):
+    return [boxes[i] for i in sort_box_order(boxes)]
+
+
+def crop_box_image(page_image, box):
+    # OpenCV comes with PaddleOCR, which is only needed once OCR actually runs
+    import cv2
+
+    box = np.asarray(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+    height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    crop = cv2.warpPerspective(
+        page_image,
+        cv2.getPerspectiveTransform(box, target),
+        (width, height),
+        borderMode=cv2.BORDER_REPLICATE,
+        flags=cv2.INTER_CUBIC,
+    )
+    if height / max(width, 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def detect_boxes(ocr_engine, page_image):
+    with get_profiler().stage("detection"):
+        detected, _ = ocr_engine.text_detector(page_image)
+    if detected is None:
+        return []
+    return sort_boxes([box.tolist() for box in detected])
+
+
+def recognize_crops(ocr_engine, crops, cls=True):
+    if not crops:
+        return []
+    profiler = get_profiler()
+    if cls and getattr(ocr_engine, "use_angle_cls", False):
+        with profiler.stage("classification"):
+            crops, _, _ = ocr_engine.text_classifier(crops)
+    with profiler.stage("recognition"):
+        recognized, _ = ocr_engine.text_recognizer(crops)
+    return recognized
+
+
+# the engine's step objects and the profiler stage each one is timed as
+engine_steps = (
+    ("text_detector", "detection"),
+    ("text_classifier", "classification"),
+    ("text_recognizer", "recognition"),
+)
+
+
+class TimedStep:
+    # stands in for one of the engine's steps, timing every call as a stage
+    def __init__(self, step, stage_name):
+        self.step = step
+        self.stage_name = stage_name
+
+    def __call__(self, *args, **kwargs):
+        with get_profiler().stage(self.stage_name):
+            return self.step(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.step, name)
+
+
+@contextlib.contextmanager
+def timed_engine_steps(ocr_engine, stage_prefix=""):
+    # times the steps the engine's own ocr() calls, so profiled runs take the
+    # same code path as unprofiled ones. Callers hold ocr_engine_lock, so no
+    # other thread runs the engine while its steps are swapped
+    steps = {
+        name: getattr(ocr_engine, name)
+        for name, _ in engine_steps
+        if getattr(ocr_engine, name, None) is not None
+    }
+    for name, stage_name in engine_steps:
+        if name in steps:
+            setattr(ocr_engine, name, TimedStep(steps[name], stage_prefix + stage_name))
+    try:
+        yield
+    finally:
+        for name, step in steps.items():
+            setattr(ocr_engine, name, step)
+
+
+def ocr_page_batch(ocr_engine, page_images, cls=True):
+    # detection runs per page, but the crops of every page go through the
+    # classifier and recognizer together, so several small pages fill the
+    # recognizer's batches. Returns one [bbox, (text, score)] list per page
+    drop_score = getattr(ocr_engine, "drop_score", 0.5)
+    page_boxes = [detect_boxes(ocr_engine, page_image) for page_image in page_images]
+    crops = [
+        crop_box_image(page_image, box)
+        for page_image, boxes in zip(page_images, page_boxes)
+        for box in boxes
+    ]
+    recognized = iter(recognize_crops(ocr_engine, crops, cls))
+    pages = []
+    for boxes in page_boxes:
+        page_result = []
+        for box, (text, score) in zip(boxes, recognized):
+            if score >= drop_score:
+                page_result.append([box, (text, score)])
+        pages.append(page_result)
+    return pages
+
+
+class RegionOfInterestOCR:
+    # wraps a PaddleOCR engine: every page gets the full detection pass, but
+    # recognition only runs on boxes the invoice parser can use. Boxes are
+    # recognized top to bottom and recognition stops once the layout plan's
+    # stop anchor line (the bottom of the last region the parser reads) has
+    # been seen, so footers and remarks below it are never recognized. When
+    # the region ends at the anchor's last line (anchors_max), later lines are
+    # looked for in the first one's column, and everything down to the last
+    # one found is recognized too. regions optionally restricts recognition
+    # further to page-relative (x0, y0, x1, y1) rectangles.
+    def __init__(self, ocr_engine, plan=None, regions=None, chunk_size=16):
+        self.ocr_engine = ocr_engine
+        plan = plan or layout_registry.default_plan
+        self.stop_regex = re.compile(plan.stop_pattern) if plan.stop_pattern else None
+        self.stop_at_last = plan.stop_at_last
+        self.regions = regions
+        self.chunk_size = chunk_size
+        self.drop_score = getattr(ocr_engine, "drop_score", 0.5)
+        self.detected_boxes = 0
+        self.recognized_boxes = 0
+
+    def is_in_regions(self, box, page_width, page_height):
+        if self.regions is None:
+            return True
+        center_x = sum(point[0] for point in box) / 4 / page_width
+        center_y = sum(point[1] for point in box) / 4 / page_height
+        return any(
+            x0 <= center_x <= x1 and y0 <= center_y <= y1
+            for x0, y0, x1, y1 in self.regions
+        )
+
+    def recognize(self, page_image, boxes, positions, cls, results):
+        # recognizes boxes[position] for each position into results
+        crops = [crop_box_image(page_image, boxes[position]) for position in positions]
+        self.recognized_boxes += len(crops)
+        results.update(zip(positions, recognize_crops(self.ocr_engine, crops, cls)))
+
+    def is_stop_anchor(self, result):
+        text, score = result
+        return (
+            self.stop_regex is not None
+            and score >= self.drop_score
+            and self.stop_regex.search(text) is not None
+        )
+
+    def ocr(self, page_image, cls=True):
+        page_height, page_width = page_image.shape[:2]
+        detected = detect_boxes(self.ocr_engine, page_image)
+        self.detected_boxes += len(detected)
+        boxes = [
+            box for box in detected if self.is_in_regions(box, page_width, page_height)
+        ]
+
+        # position in boxes -> (text, score)
+        results = {}
+        stop_box = None
+        for start in range(0, len(boxes), self.chunk_size):
+            positions = range(start, min(start + self.chunk_size, len(boxes)))
+            if stop_box is not None:
+                # finish the stop anchor's line (its amount), then stop
+                positions = [
+                    position
+                    for position in positions
+                    if boxes[position][0][1] <= stop_box[2][1]
+                ]
+                if not positions:
+                    break
+            self.recognize(page_image, boxes, positions, cls, results)
+            if stop_box is None:
+                stop_box = next(
+                    (
+                        boxes[position]
+                        for position in positions
+                        if self.is_stop_anchor(results[position])
+                    ),
+                    None,
+                )
+
+        if stop_box is not None and self.stop_at_last:
+            stop_y = self.find_last_stop_y(page_image, boxes, stop_box, cls, results)
+            self.recognize(
+                page_image,
+                boxes,
+                [
+                    position
+                    for position in range(len(boxes))
+                    if position not in results and boxes[position][0][1] <= stop_y
+                ],
+                cls,
+                results,
+            )
+
+        page_result = []
+        for position in sorted(results):
+            text, score = results[position]
+            if score >= self.drop_score:
+                page_result.append([boxes[position], (text, score)])
+        return [page_result]
+
+    def find_last_stop_y(self, page_image, boxes, stop_box, cls, results):
+        # the bottom of the last stop anchor line, looking for later ones
+        # among the boxes below that overlap the first one horizontally
+        left, right = stop_box[0][0], stop_box[1][0]
+        positions = [
+            position
+            for position in range(len(boxes))
+            if position not in results
+            and boxes[position][0][0] <= right
+            and boxes[position][1][0] >= left
+        ]
+        self.recognize(page_image, boxes, positions, cls, results)
+        return max(
+            [stop_box[2][1]]
+            + [
+                boxes[position][2][1]
+                for position in positions
+                if self.is_stop_anchor(results[position])
+            ]
+        )
@@ -0,0 +1,227 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf_to_json import (
+    LazyOCRResults,
+    get_rendered_page_height,
+    ocr_engine_lock,
+    ocr_engine_pool,
+    ocr_result_cache,
+    parse_invoice_page,
+)
+from roi_ocr import RegionOfInterestOCR, ocr_page_batch
+
+
+class ServiceStats:
+    def __init__(self):
+        self.pages = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    def record_batch(self, batch_size):
+        self.batches += 1
+        self.pages += batch_size
+        self.largest_batch = max(self.largest_batch, batch_size)
+
+    def get_mean_batch_size(self):
+        return self.pages / self.batches if self.batches else 0.0
+
+
+class InvoiceService:
+    # asyncio front end for OCR and parsing. Pages submitted by concurrent
+    # callers are queued and a scheduler task hands them to the OCR engine in
+    # batches, on a single dedicated thread since the engine is not thread
+    # safe. PyMuPDF is not thread safe either, so everything that opens a PDF
+    # (rendering, page counts, text layers) runs on a second single thread.
+    # Parsing and cache writes run on a thread pool, so the event loop itself
+    # never blocks
+    def __init__(
+        self,
+        ocr_config=None,
+        ocr_engine=None,
+        parser="pandas",
+        max_batch_size=8,
+        max_wait=0.005,
+        workers=4,
+        use_cache=True,
+        use_text_layer=False,
+        dpi=None,
+        row_tolerance=None,
+    ):
+        self.ocr_config = ocr_config or {"use_angle_cls": True, "lang": "en"}
+        self.ocr_engine = ocr_engine
+        self.parser = parser
+        self.max_batch_size = max_batch_size
+        # how long the scheduler holds a partial batch open for more pages
+        self.max_wait = max_wait
+        self.ocr_cache = ocr_result_cache if use_cache else None
+        self.use_text_layer = use_text_layer
+        self.dpi = dpi
+        self.row_tolerance = row_tolerance
+        self.workers = workers
+        # created by start(), so a closed service can be started again
+        self.ocr_executor = None
+        self.render_executor = None
+        self.worker_executor = None
+        self.queue = None
+        self.scheduler_task = None
+        self.stats = ServiceStats()
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def start(self):
+        if self.ocr_executor is None:
+            self.ocr_executor = ThreadPoolExecutor(max_workers=1)
+            self.render_executor = ThreadPoolExecutor(max_workers=1)
+            self.worker_executor = ThreadPoolExecutor(max_workers=self.workers)
+        if self.scheduler_task is None:
+            self.queue = asyncio.Queue()
+            self.scheduler_task = asyncio.get_running_loop().create_task(
+                self.run_scheduler()
+            )
+
+    async def close(self):
+        # callers still waiting on OCR get RuntimeError instead of hanging
+        if self.scheduler_task is not None:
+            self.scheduler_task.cancel()
+            try:
+                await self.scheduler_task
+            except asyncio.CancelledError:
+                pass
+            self.scheduler_task = None
+            while not self.queue.empty():
+                _, future = self.queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("InvoiceService closed"))
+            self.queue = None
+        for executor in (
+            self.ocr_executor,
+            self.render_executor,
+            self.worker_executor,
+        ):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self.ocr_executor = None
+        self.render_executor = None
+        self.worker_executor = None
+
+    def uses_batched_ocr(self):
+        # ROI engines are run page by page through their own ocr(), exactly as
+        # PDFToOCR runs them
+        if self.ocr_engine is not None:
+            return not isinstance(self.ocr_engine, RegionOfInterestOCR)
+        return not self.ocr_config.get("roi_mode", False)
+
+    def ocr_batch(self, page_images):
+        if self.ocr_engine is None:
+            self.ocr_engine = ocr_engine_pool.get_engine(**self.ocr_config)
+        with ocr_engine_lock:
+            if isinstance(self.ocr_engine, RegionOfInterestOCR):
+                # ROI mode stops recognition per page, so pages can't be pooled
+                return [
+                    self.ocr_engine.ocr(page_image)[0] or []
+                    for page_image in page_images
+                ]
+            return ocr_page_batch(self.ocr_engine, page_images)
+
+    async def run_scheduler(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                # give other callers a moment to fill the batch, unless the
+                # queue already holds enough pages
+                if self.max_wait > 0 and self.queue.qsize() < self.max_batch_size - 1:
+                    await asyncio.sleep(self.max_wait)
+                while len(batch) < self.max_batch_size and not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+
+                page_images = [page_image for page_image, _ in batch]
+                pages = await loop.run_in_executor(
+                    self.ocr_executor, self.ocr_batch, page_images
+                )
+            except asyncio.CancelledError:
+                # closed with the batch already taken off the queue
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("InvoiceService closed"))
+                raise
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.stats.record_batch(len(batch))
+            for (_, future), page in zip(batch, pages):
+                if not future.done():
+                    future.set_result(page)
+
+    async def ocr_page_image(self, page_image):
+        # page_image is a BGR array, as render_pdf_page returns
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((page_image, future))
+        return await future
+
+    async def run_in_worker(self, func, *args):
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.worker_executor, func, *args
+        )
+
+    async def run_in_renderer(self, func, *args):
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(
+            self.render_executor, func, *args
+        )
+
+    async def parse_page(self, page, page_height=None):
+        return await self.run_in_worker(
+            functools.partial(
+                parse_invoice_page,
+                page,
+                parser=self.parser,
+                page_height=page_height,
+                row_tolerance=self.row_tolerance,
+            )
+        )
+
+    async def parse_page_image(self, page_image):
+        page = await self.ocr_page_image(page_image)
+        return await self.parse_page(page, page_height=page_image.shape[0])
+
+    async def parse_pdf_page(self, ocr_results, page_index):
+        page = await self.run_in_renderer(ocr_results.get_stored_page, page_index)
+        if page is None:
+            page_image = await self.run_in_renderer(ocr_results.render_page, page_index)
+            page = await self.ocr_page_image(page_image)
+            await self.run_in_worker(ocr_results.store_page, page_index, page)
+        page_height = await self.run_in_renderer(
+            get_rendered_page_height, ocr_results.pdf_path, page_index, self.dpi
+        )
+        return await self.parse_page(page, page_height=page_height)
+
+    async def parse_pdf(self, pdf_path, page_num=0):
+        # returns the invoice JSON of every page, in page order
+        ocr_results = LazyOCRResults(
+            pdf_path,
+            page_num=page_num,
+            ocr_config=self.ocr_config,
+            ocr_cache=self.ocr_cache,
+            use_text_layer=self.use_text_layer,
+            dpi=self.dpi,
+            batched_ocr=self.uses_batched_ocr(),
+        )
+        page_count = await self.run_in_renderer(len, ocr_results)
+        return await asyncio.gather(
+            *(
+                self.parse_pdf_page(ocr_results, page_index)
+                for page_index in range(page_count)
+            )
+        )
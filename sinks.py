@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def encode_json(value, indent=False):
+    # UTF-8 encoded JSON, through orjson when it is installed
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(value, indent=2 if indent else None, ensure_ascii=False).encode(
+        "utf-8"
+    )
+
+
+class InvoiceSink:
+    # where parsed invoices go: write() is called once per page,
+    # end_document() once a document's last page is written and close() once
+    # all pages are written. buffered sinks only write a document's output
+    # when it ends (or on close)
+    buffered = False
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        raise NotImplementedError
+
+    def end_document(self, pdf_path):
+        pass
+
+    def get_output_location(self, pdf_path):
+        return None
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MemorySink(InvoiceSink):
+    # keeps every invoice in a list, in the order written
+    def __init__(self):
+        self.records = []
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        self.records.append(
+            {"pdf_path": pdf_path, "page_index": page_index, "invoice": invoice_json}
+        )
+
+    def get_invoices(self):
+        return [record["invoice"] for record in self.records]
+
+
+def read_written_pages(path):
+    # {(pdf_path, page_index)} of the records in an existing JSON Lines
+    # output, after truncating it to its last complete line
+    pages = set()
+    if not os.path.exists(path):
+        return pages
+    with open(path, "r+b") as f:
+        end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            end += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "page_index" in record:
+                pages.add((record.get("pdf_path"), record["page_index"]))
+        f.truncate(end)
+    return pages
+
+
+class JSONLinesSink(InvoiceSink):
+    # one JSON line per page, flushed as it is written; include_source wraps
+    # each invoice with the PDF path and page index it came from. path may
+    # also be an open binary stream such as sys.stdout.buffer, which is left
+    # open. append adds to an existing file, e.g. when resuming a batch: a
+    # last line cut short by a crash is dropped first, and the pages already
+    # in the file are kept in written_pages so they need not be redone
+    def __init__(self, path, include_source=True, append=False):
+        self.path = path
+        self.include_source = include_source
+        self.owns_file = isinstance(path, (str, os.PathLike))
+        self.written_pages = set()
+        if append and self.owns_file:
+            self.written_pages = read_written_pages(path)
+        self.file = open(path, "ab" if append else "wb") if self.owns_file else path
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        if self.include_source:
+            record = {
+                "pdf_path": pdf_path,
+                "page_index": page_index,
+                "invoice": invoice_json,
+            }
+        else:
+            record = invoice_json
+        self.file.write(encode_json(record) + b"\n")
+        self.file.flush()
+
+    def get_output_location(self, pdf_path):
+        return os.fspath(self.path) if self.owns_file else None
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+
+
+class DocumentFileSink(InvoiceSink):
+    # one JSON file per PDF (<output_dir>/<pdf name>-<path hash>.json) holding
+    # its pages' invoices in page order, written as soon as the document ends,
+    # so only unfinished documents are held in memory. The hash of the PDF's
+    # absolute path keeps same-named PDFs from different directories apart,
+    # and files are renamed into place, so a crash never leaves a partial one
+    buffered = True
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.documents = {}
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        self.documents.setdefault(pdf_path, []).append((page_index, invoice_json))
+
+    def get_document_path(self, pdf_path):
+        pdf_path = pdf_path or "invoice"
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        path_hash = hashlib.sha256(os.path.abspath(pdf_path).encode("utf-8"))
+        return os.path.join(
+            self.output_dir, f"{name}-{path_hash.hexdigest()[:12]}.json"
+        )
+
+    def get_output_location(self, pdf_path):
+        return self.get_document_path(pdf_path)
+
+    def end_document(self, pdf_path):
+        pages = self.documents.pop(pdf_path, None)
+        if pages is None:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        pages.sort(key=lambda page: page[0] if page[0] is not None else -1)
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(encode_json([invoice for _, invoice in pages], indent=True))
+            os.replace(tmp_path, self.get_document_path(pdf_path))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def close(self):
+        for pdf_path in list(self.documents):
+            self.end_document(pdf_path)
+
+
+class BackgroundSink(InvoiceSink):
+    # hands writes to another sink on a background thread, so encoding and
+    # file I/O don't block the parsing loop; a full queue (max_pending) makes
+    # writers wait. Errors from the wrapped sink are raised on close
+    def __init__(self, sink, max_pending=1024):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                method, args = item
+                try:
+                    method(*args)
+                except Exception as error:
+                    self.error = error
+
+    def write(self, invoice_json, pdf_path=None, page_index=None):
+        self.queue.put((self.sink.write, (invoice_json, pdf_path, page_index)))
+
+    def end_document(self, pdf_path):
+        self.queue.put((self.sink.end_document, (pdf_path,)))
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
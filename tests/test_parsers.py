@@ -0,0 +1,111 @@
+import glob
+import json
+import os
+
+import pytest
+
+from benchmarks.synthetic_invoice import make_invoice_document, make_invoice_page
+from pdf_to_json import PDFToOCR, invoice_parsers, parse_invoice_page
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+expected_dir = os.path.join(tests_dir, "expected")
+fixtures_dir = os.path.join(os.path.dirname(tests_dir), "benchmarks", "fixtures")
+
+# synthetic documents: line items per page, noise boxes per page and pages
+synthetic_cases = {
+    "synthetic_10_items": (10, 0, 1),
+    "synthetic_200_items": (200, 0, 1),
+    "synthetic_50_items_2000_noise": (50, 2000, 1),
+    "synthetic_3_pages": (20, 50, 3),
+}
+
+
+def load_case_pages(case_name):
+    # recorded OCR fixtures are read the way saved PaddleOCR results are
+    if case_name in synthetic_cases:
+        n_items, n_noise, n_pages = synthetic_cases[case_name]
+        if n_pages == 1:
+            return [make_invoice_page(n_items, n_noise)]
+        return make_invoice_document(n_pages=n_pages, n_items=n_items, n_noise=n_noise)
+    fixture_path = os.path.join(fixtures_dir, case_name + ".json")
+    return PDFToOCR(from_json=True, ocr_json_path=fixture_path).ocr_results
+
+
+def get_case_names():
+    fixture_names = [
+        os.path.splitext(os.path.basename(path))[0]
+        for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json")))
+    ]
+    return fixture_names + list(synthetic_cases)
+
+
+def get_expected_path(case_name):
+    return os.path.join(expected_dir, case_name + ".json")
+
+
+def parse_case(case_name, parser):
+    # through a JSON round trip, as the invoices are written out
+    invoices = [
+        parse_invoice_page(page, parser=parser) for page in load_case_pages(case_name)
+    ]
+    return json.loads(json.dumps(invoices))
+
+
+@pytest.mark.parametrize("parser", sorted(invoice_parsers))
+@pytest.mark.parametrize("case_name", get_case_names())
+def test_parser_matches_expected_json(case_name, parser):
+    with open(get_expected_path(case_name)) as f:
+        expected = json.load(f)
+    assert parse_case(case_name, parser) == expected
+
+
+@pytest.mark.parametrize("parser", sorted(invoice_parsers))
+def test_empty_payment_region_gives_no_totals(parser):
+    payment_labels = ("GST 7%", "AMOUNT PAYABLE", "Medisave")
+    page = [
+        box
+        for box in make_invoice_page(n_items=3)
+        if not any(label in box[1][0] for label in payment_labels)
+    ]
+    assert parse_invoice_page(page, parser=parser)["TotalPayments"] == {}
+
+
+@pytest.mark.parametrize("parser", sorted(invoice_parsers))
+def test_amounts_are_exact_decimal_strings(parser):
+    # amounts without a decimal point are cents, however few digits they have
+    page = make_invoice_page(n_items=3)
+    amount_boxes = [box for box in page if box[0][0][0] == 900.0][1:4]
+    for box, text in zip(amount_boxes, ["7", "45", "0"]):
+        box[1] = (text, box[1][1])
+    invoice = parse_invoice_page(page, parser=parser)
+    assert [item["item_amount"] for item in invoice["Table"]] == [
+        "0.07",
+        "0.45",
+        "0.00",
+    ]
+    assert invoice["TotalPayments"]["LessMedisave"] == "100.00"
+
+
+@pytest.mark.parametrize("parser", sorted(invoice_parsers))
+@pytest.mark.parametrize("row_tolerance", [None, 10])
+@pytest.mark.parametrize("missing_header", ["DESCRIPTION", "QUANTITY"])
+def test_missing_column_header_fails_the_page(parser, row_tolerance, missing_header):
+    # without the header the column border is lost and cells shift into the
+    # neighbouring column, which must not pass as a parsed page
+    page = [box for box in make_invoice_page(n_items=12) if box[1][0] != missing_header]
+    with pytest.raises(ValueError, match="no cells"):
+        parse_invoice_page(page, parser=parser, row_tolerance=row_tolerance)
+
+
+def record_expected():
+    # re-records the expected JSON with the pandas parser; only for changes
+    # meant to alter the output
+    os.makedirs(expected_dir, exist_ok=True)
+    for case_name in get_case_names():
+        with open(get_expected_path(case_name), "w") as f:
+            json.dump(parse_case(case_name, "pandas"), f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    record_expected()
@@ -0,0 +1,66 @@
+import numpy as np
+
+import roi_ocr
+from benchmarks.synthetic_invoice import make_box, make_invoice_page
+from pdf_to_json import parse_invoice_page
+from roi_ocr import RegionOfInterestOCR, ocr_page_batch
+
+
+class FakeOCREngine:
+    # detects the page's boxes and recognizes each one as its text; crops are
+    # the boxes themselves (see crop_box)
+    drop_score = 0.5
+    use_angle_cls = False
+
+    def __init__(self, page):
+        self.page = page
+        self.texts = {get_box_key(box): text_score for box, text_score in page}
+
+    def text_detector(self, page_image):
+        return np.array([box for box, _ in self.page], dtype=np.float32), 0.0
+
+    def text_recognizer(self, crops):
+        return [self.texts[get_box_key(box)] for box in crops], 0.0
+
+
+def get_box_key(box):
+    return tuple(tuple(point) for point in box)
+
+
+def crop_box(page_image, box):
+    return box
+
+
+def make_page_with_two_net_amounts():
+    # an interim bill: a deposit is taken off after the first net amount
+    # payable, and a second one closes the payment block
+    page = make_invoice_page(n_items=3)
+    net_box = [box for box in page if box[1][0] == "NET AMOUNT PAYABLE"][0]
+    y = net_box[0][2][1] + 5
+    page += [
+        make_box(60, y, 400, y + 20, "Less: Deposit"),
+        make_box(900, y, 990, y + 20, "50.00"),
+        make_box(60, y + 25, 400, y + 45, "NET AMOUNT PAYABLE"),
+        make_box(900, y + 25, 990, y + 45, "1.00"),
+        make_box(500, y + 100, 850, y + 120, "remark line"),
+    ]
+    # coordinates as the detector returns them
+    return [[np.float32(box).tolist(), text_score] for box, text_score in page]
+
+
+def test_roi_ocr_reads_up_to_the_last_stop_anchor(monkeypatch):
+    monkeypatch.setattr(roi_ocr, "crop_box_image", crop_box)
+    page = make_page_with_two_net_amounts()
+    engine = FakeOCREngine(page)
+    page_image = np.zeros((2000, 1100), dtype=np.uint8)
+
+    roi_engine = RegionOfInterestOCR(engine)
+    roi_page = roi_engine.ocr(page_image)[0]
+    full_page = ocr_page_batch(engine, [page_image])[0]
+
+    roi_totals = parse_invoice_page(roi_page)["TotalPayments"]
+    assert roi_totals == parse_invoice_page(full_page)["TotalPayments"]
+    assert roi_totals["LessDeposit"] == "50.00"
+    assert roi_totals["NetAmountPayable"] == "1.00"
+    # the remark below the payment block is still left out
+    assert roi_engine.recognized_boxes < roi_engine.detected_boxes
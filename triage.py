@@ -0,0 +1,93 @@
+import re
+import time
+
+from layouts import layout_registry
+from pdf_to_json import get_rendered_page_height, ocr_engine_pool, run_ocr
+
+
+class PageTriage:
+    # decides whether a page is worth full OCR and parsing by reading only its
+    # header strip, where the parser finds the hospital name and the
+    # "TAX INVOICE" title. Cover sheets, remarks and continuation pages fail
+    # the check and are skipped before full-page OCR
+    def __init__(self, ocr_engine=None, ocr_config=None, header_fraction=0.15):
+        self.ocr_engine = ocr_engine
+        self.ocr_config = ocr_config or {"use_angle_cls": True, "lang": "en"}
+        self.header_fraction = header_fraction
+        hospital_names = layout_registry.get_hospital_names()
+        self.required_patterns = {
+            "hospital name": re.compile(
+                "|".join(r"\s*".join(name.split()) for name in hospital_names),
+                re.IGNORECASE,
+            ),
+            "TAX INVOICE": re.compile(r"TAX\s*INVOICE"),
+        }
+
+    def get_engine(self):
+        if self.ocr_engine is None:
+            # the header strip is upright text, so the base engine without ROI
+            # mode is used and the angle classifier is skipped
+            self.ocr_engine = ocr_engine_pool.get_engine(
+                **dict(self.ocr_config, roi_mode=False)
+            )
+        return self.ocr_engine
+
+    def classify_texts(self, texts):
+        # returns (is_invoice, reason)
+        header_text = " ".join(texts)
+        for name, pattern in self.required_patterns.items():
+            if not pattern.search(header_text):
+                return False, f"no {name} in header"
+        return True, "invoice"
+
+    def classify_page(self, page, page_height):
+        # a page that is already OCR'd (cache or text layer) needs no OCR
+        header_bottom = page_height * self.header_fraction
+        return self.classify_texts(
+            text for box, (text, _) in page if box[0][1] < header_bottom
+        )
+
+    def classify_image(self, page_image):
+        header_strip = page_image[: int(page_image.shape[0] * self.header_fraction)]
+        header = run_ocr(
+            self.get_engine(), header_strip, cls=False, stage_prefix="triage_"
+        )
+        return self.classify_texts(text for _, (text, _) in header)
+
+
+def triage_page(pdf_to_ocr, page_index, page_triage):
+    # returns (page, verdict) where page is the full OCR result, or None for a
+    # skipped page; the rendered page is shared by triage and full OCR
+    ocr_results = pdf_to_ocr.ocr_results
+    verdict = {
+        "is_invoice": True,
+        "reason": "invoice",
+        "triage_time": 0.0,
+        "ocr_time": 0.0,
+    }
+
+    page = ocr_results.get_stored_page(page_index)
+    if page is not None:
+        page_height = get_rendered_page_height(
+            ocr_results.pdf_path, page_index, ocr_results.dpi
+        )
+        verdict["is_invoice"], verdict["reason"] = page_triage.classify_page(
+            page, page_height
+        )
+        return (page if verdict["is_invoice"] else None), verdict
+
+    page_image = ocr_results.render_page(page_index)
+    start = time.perf_counter()
+    verdict["is_invoice"], verdict["reason"] = page_triage.classify_image(page_image)
+    verdict["triage_time"] = time.perf_counter() - start
+    if not verdict["is_invoice"]:
+        return None, verdict
+
+    if ocr_results.ocr_engine is None:
+        ocr_results.ocr_engine = ocr_engine_pool.get_engine(**ocr_results.ocr_config)
+    start = time.perf_counter()
+    ocr_results.engine_calls += 1
+    page = run_ocr(ocr_results.ocr_engine, page_image)
+    verdict["ocr_time"] = time.perf_counter() - start
+    ocr_results.store_page(page_index, page)
+    return page, verdict